@@ -0,0 +1,3 @@
+#!/bin/bash
+
+python -m celery -A mec_connect.worker beat -l INFO
@@ -3,6 +3,9 @@
 if [ "$1" = "dev" ]
 then
     python manage.py runserver 0.0.0.0:8002
+elif [[ "${API_ASYNC,,}" =~ ^(true|on|yes|1)$ ]]
+then
+    gunicorn --timeout 300 mec_connect.asgi:application -k uvicorn.workers.UvicornWorker --log-file -
 else
     gunicorn --timeout 300 mec_connect.wsgi:application --log-file -
 fi
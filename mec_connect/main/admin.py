@@ -9,11 +9,14 @@ from django.utils.translation import gettext_lazy as _
 from httpx import HTTPStatusError
 
 from .choices import GristColumnType
+from .compiled import compile_config
 from .models import (
     GristColumn,
     GristColumnFilter,
     GristConfig,
     GritColumnConfig,
+    RecocoProject,
+    SyncJob,
     User,
     WebhookEvent,
 )
@@ -33,7 +36,9 @@ class WebhookEventAdmin(admin.ModelAdmin):
         "topic",
         "object_id",
         "object_type",
+        "project_id",
         "status",
+        "attempts",
         "created",
     )
 
@@ -44,6 +49,53 @@ class WebhookEventAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(RecocoProject)
+class RecocoProjectAdmin(admin.ModelAdmin):
+    list_display = (
+        "project_id",
+        "updated_on",
+        "modified",
+    )
+    search_fields = ("project_id",)
+    readonly_fields = (
+        "project_id",
+        "payload",
+        "survey_answers",
+        "updated_on",
+        "content_hash",
+    )
+
+
+@admin.register(SyncJob)
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "grist_config",
+        "kind",
+        "status",
+        "processed_projects",
+        "written_records",
+        "cursor",
+        "created",
+        "modified",
+        "finished",
+    )
+    list_filter = (
+        "kind",
+        "status",
+    )
+    readonly_fields = (
+        "grist_config",
+        "kind",
+        "cursor",
+        "processed_projects",
+        "written_records",
+        "task_id",
+        "finished",
+        "exception",
+    )
+
+
 @admin.register(GristColumn)
 class GristColumnAdmin(admin.ModelAdmin):
     list_display = (
@@ -126,8 +178,10 @@ class GristConfigAdmin(admin.ModelAdmin):
             )
             return
 
+        compiled_config = compile_config(config)
+
         try:
-            table_exists = grist_table_exists(config)
+            table_exists = grist_table_exists(compiled_config)
         except HTTPStatusError as err:
             if err.response.status_code == 404:
                 self.message_user(
@@ -147,7 +201,7 @@ class GristConfigAdmin(admin.ModelAdmin):
             )
             return
 
-        if not check_table_columns_consistency(config):
+        if not check_table_columns_consistency(compiled_config):
             self.message_user(
                 request,
                 f"Configuration {config}: les colonnes ne sont pas cohérentes. "
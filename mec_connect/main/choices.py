@@ -5,6 +5,7 @@ from django.db import models
 
 class WebhookEventStatus(models.TextChoices):
     PENDING = "PENDING", "Pending"
+    PROCESSING = "PROCESSING", "Processing"
     PROCESSED = "PROCESSED", "Processed"
     INVALID = "INVALID", "Invalid"
     FAILED = "FAILED", "Failed"
@@ -33,3 +34,22 @@ class FilterOperator(models.TextChoices):
     I_NOT_EQUAL = "ine", "Not equal (case-insensitive)"
     CONTAINS = "contains", "Contains"
     I_CONTAINS = "icontains", "Contains (case-insensitive)"
+
+
+class SurveyAnswerStrategy(models.TextChoices):
+    CHOICES = "choices", "Choices, with a comment column"
+    COMMENT = "comment", "Comment"
+    ATTACHMENT = "attachment", "Comment, with an attachment column"
+    BOOLEAN = "boolean", "Boolean"
+    FLOAT = "float", "Float"
+
+
+class SyncJobKind(models.TextChoices):
+    POPULATE = "POPULATE", "Populate"
+    REFRESH = "REFRESH", "Refresh"
+
+
+class SyncJobStatus(models.TextChoices):
+    RUNNING = "RUNNING", "Running"
+    DONE = "DONE", "Done"
+    FAILED = "FAILED", "Failed"
@@ -1,4 +1,4 @@
 from __future__ import annotations
 
-from .grist import GristApiClient
-from .recoco import RecocoApiClient
+from .grist import AsyncGristApiClient, GristApiClient
+from .recoco import AsyncRecocoApiClient, RecocoApiClient
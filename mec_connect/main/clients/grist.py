@@ -1,48 +1,193 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import threading
+from abc import ABC, abstractmethod
+from itertools import batched
 from typing import Any, Self
+from weakref import WeakKeyDictionary
 
-from httpx import Client, Response
+from django.conf import settings
+from httpx import (
+    AsyncBaseTransport,
+    AsyncClient,
+    AsyncHTTPTransport,
+    BaseTransport,
+    Client,
+    HTTPTransport,
+    Limits,
+    Response,
+)
 from main.models import GristConfig
 
+from .throttling import AsyncThrottledTransport, RetryPolicy, ThrottledTransport, get_bucket
+
 logger = logging.getLogger(__name__)
 
+_clients: dict[tuple[str, str, str], GristApiClient] = {}
+_config_client_keys: dict[Any, tuple[str, str, str]] = {}
+_async_clients: WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, AsyncGristApiClient]] = (
+    WeakKeyDictionary()
+)
+_clients_lock = threading.Lock()
+
 
 def raise_on_4xx_5xx(response: Response):
     response.raise_for_status()
 
 
-class GristApiClient:
+async def araise_on_4xx_5xx(response: Response):
+    response.raise_for_status()
+
+
+def upsert_payload(
+    records: list[dict[str, Any]] | tuple[dict[str, Any], ...], key_columns: list[str]
+) -> dict[str, Any]:
+    return {
+        "records": [
+            {
+                "require": {k: r[k] for k in key_columns},
+                "fields": {k: v for k, v in r.items() if k not in key_columns},
+            }
+            for r in records
+        ]
+    }
+
+
+class BaseGristApiClient(ABC):
     api_key: str
     api_base_url: str
     doc_id: str
 
-    _client: Client
-
-    def __init__(self, api_key: str, api_base_url: str, doc_id: str):
+    def __init__(
+        self,
+        api_key: str,
+        api_base_url: str,
+        doc_id: str,
+        rate_limit: float | None = None,
+        max_retries: int | None = None,
+        **kwargs,
+    ):
         self.api_key = api_key
         self.api_base_url = api_base_url
         self.doc_id = doc_id
-        self._client = Client(
-            headers=self.headers,
-            base_url=self.api_base_url,
-            event_hooks={"response": [raise_on_4xx_5xx]},
+        # a client with a rate limit of its own is not throttled along with the others
+        self.rate_limit_scope = None if rate_limit is None else f"{doc_id}:{api_key}"
+        self.rate_limit, self.max_retries = self.throttling_settings(rate_limit, max_retries)
+        self._client = self._build_client(**kwargs)
+
+    @staticmethod
+    def throttling_settings(
+        rate_limit: float | None, max_retries: int | None
+    ) -> tuple[float | None, int]:
+        """Rate limit and max retries, the default ones when not given."""
+
+        return (
+            settings.GRIST_API_RATE_LIMIT if rate_limit is None else rate_limit,
+            settings.GRIST_API_MAX_RETRIES if max_retries is None else max_retries,
         )
 
+    @abstractmethod
+    def _build_client(self, **kwargs) -> Client | AsyncClient: ...
+
     @classmethod
     def from_config(cls, config: GristConfig) -> Self:
         return cls(
             api_key=config.api_key,
             api_base_url=config.api_base_url,
             doc_id=config.doc_id,
+            rate_limit=config.api_rate_limit,
+            max_retries=config.api_max_retries,
         )
 
     @property
     def headers(self) -> dict[str, str]:
         return {"Authorization": f"Bearer {self.api_key}"}
 
+    @property
+    def client_options(self) -> dict[str, Any]:
+        return {
+            "headers": self.headers,
+            "base_url": self.api_base_url,
+        }
+
+    @property
+    def transport_options(self) -> dict[str, Any]:
+        return {
+            "limits": Limits(
+                max_connections=settings.GRIST_API_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GRIST_API_MAX_CONNECTIONS,
+                keepalive_expiry=settings.GRIST_API_KEEPALIVE_EXPIRY,
+            ),
+            "http2": settings.GRIST_API_HTTP2,
+        }
+
+    @property
+    def throttling_options(self) -> dict[str, Any]:
+        return {
+            "bucket": get_bucket(
+                self.api_base_url,
+                rate=self.rate_limit,
+                burst=settings.GRIST_API_RATE_BURST,
+                scope=self.rate_limit_scope,
+            ),
+            "policy": RetryPolicy(
+                max_retries=self.max_retries,
+                backoff_base=settings.HTTP_BACKOFF_BASE,
+                backoff_max=settings.HTTP_BACKOFF_MAX,
+            ),
+        }
+
+
+class GristApiClient(BaseGristApiClient):
+    """
+    Sync Grist API client.
+
+    Clients built from a config are kept in a registry, one per API URL, API key
+    and document, so that their keep-alive connections are reused for the life
+    of the process. A registered client is dropped when a config using it is saved,
+    and built again when its throttling settings differ from the config ones, as
+    the config may have been saved by another process.
+    """
+
+    _client: Client
+
+    def _build_client(self, transport: BaseTransport | None = None, **kwargs) -> Client:
+        return Client(
+            transport=ThrottledTransport(
+                transport or HTTPTransport(**self.transport_options), **self.throttling_options
+            ),
+            event_hooks={"response": [raise_on_4xx_5xx]},
+            **(self.client_options | kwargs),
+        )
+
+    @classmethod
+    def from_config(cls, config: GristConfig) -> Self:
+        key = (config.api_base_url, config.api_key, config.doc_id)
+        throttling = cls.throttling_settings(config.api_rate_limit, config.api_max_retries)
+        with _clients_lock:
+            if (previous_key := _config_client_keys.get(config.pk)) not in (None, key):
+                _clients.pop(previous_key, None)
+            client = _clients.get(key)
+            if client is None or (client.rate_limit, client.max_retries) != throttling:
+                client = _clients[key] = super().from_config(config)
+            _config_client_keys[config.pk] = key
+        return client
+
+    @classmethod
+    def invalidate(cls, config: GristConfig) -> None:
+        """Drop the registered clients related to a config, they will be built again."""
+
+        with _clients_lock:
+            for key in (
+                _config_client_keys.pop(config.pk, None),
+                (config.api_base_url, config.api_key, config.doc_id),
+            ):
+                # not closed, as it may still be used by a running task
+                _clients.pop(key, None)
+
     def get_tables(self) -> dict[str, Any]:
         resp = self._client.get(f"docs/{self.doc_id}/tables/")
         return resp.json()
@@ -65,10 +210,10 @@ class GristApiClient:
         )
         return resp.json()
 
-    def get_records(self, table_id: str, filter: dict[str, Any]) -> dict[str, Any]:
+    def get_records(self, table_id: str, filter: dict[str, Any] | None = None) -> dict[str, Any]:
         resp = self._client.get(
             f"docs/{self.doc_id}/tables/{table_id}/records/",
-            params={"filter": json.dumps(filter)},
+            params={"filter": json.dumps(filter)} if filter else None,
         )
         return resp.json()
 
@@ -85,3 +230,130 @@ class GristApiClient:
             json={"records": [{"id": k, "fields": v} for k, v in records.items()]},
         )
         return resp.json()
+
+    def upsert_records(
+        self,
+        table_id: str,
+        records: list[dict[str, Any]],
+        key_columns: list[str] | None = None,
+        batch_size: int | None = None,
+    ) -> None:
+        """Add records, or update the existing ones matching on the key columns."""
+
+        for batch in batched(records, batch_size or settings.GRIST_API_BATCH_SIZE):
+            self._client.put(
+                f"docs/{self.doc_id}/tables/{table_id}/records/",
+                json=upsert_payload(records=batch, key_columns=key_columns or ["object_id"]),
+            )
+
+
+class AsyncGristApiClient(BaseGristApiClient):
+    """
+    Async Grist API client.
+
+    Clients built from a config are kept in a registry of the running event loop,
+    one per API URL, API key, document and throttling settings, as connections
+    can't be shared between loops. They must be closed with `aclose_all` before
+    the loop is.
+    """
+
+    _client: AsyncClient
+
+    def _build_client(self, transport: AsyncBaseTransport | None = None, **kwargs) -> AsyncClient:
+        return AsyncClient(
+            transport=AsyncThrottledTransport(
+                transport or AsyncHTTPTransport(**self.transport_options),
+                **self.throttling_options,
+            ),
+            event_hooks={"response": [araise_on_4xx_5xx]},
+            **(self.client_options | kwargs),
+        )
+
+    @classmethod
+    def from_config(cls, config: GristConfig) -> Self:
+        key = (
+            config.api_base_url,
+            config.api_key,
+            config.doc_id,
+            *cls.throttling_settings(config.api_rate_limit, config.api_max_retries),
+        )
+        with _clients_lock:
+            clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+            client = clients.get(key)
+            if client is None:
+                client = clients[key] = super().from_config(config)
+        return client
+
+    @classmethod
+    async def aclose_all(cls) -> None:
+        """Close the registered clients of the running event loop."""
+
+        with _clients_lock:
+            clients = _async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def get_tables(self) -> dict[str, Any]:
+        resp = await self._client.get(f"docs/{self.doc_id}/tables/")
+        return resp.json()
+
+    async def table_exists(self, table_id: str) -> bool:
+        resp = await self.get_tables()
+        for table in resp["tables"]:
+            if table["id"] == table_id:
+                return True
+        return False
+
+    async def get_table_columns(self, table_id: str) -> list[dict[str, Any]]:
+        resp = await self._client.get(f"docs/{self.doc_id}/tables/{table_id}/columns/")
+        return resp.json().get("columns", [])
+
+    async def create_table(self, table_id: str, columns: dict[str, Any]) -> dict[str, Any]:
+        resp = await self._client.post(
+            f"docs/{self.doc_id}/tables/",
+            json={"tables": [{"id": table_id, "columns": columns}]},
+        )
+        return resp.json()
+
+    async def get_records(
+        self, table_id: str, filter: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        resp = await self._client.get(
+            f"docs/{self.doc_id}/tables/{table_id}/records/",
+            params={"filter": json.dumps(filter)} if filter else None,
+        )
+        return resp.json()
+
+    async def create_records(self, table_id: str, records: list[dict[str, Any]]) -> dict[str, Any]:
+        resp = await self._client.post(
+            f"docs/{self.doc_id}/tables/{table_id}/records/",
+            json={"records": [{"fields": r} for r in records]},
+        )
+        return resp.json()
+
+    async def update_records(
+        self, table_id: str, records: dict[str, dict[str, Any]]
+    ) -> dict[str, Any]:
+        resp = await self._client.patch(
+            f"docs/{self.doc_id}/tables/{table_id}/records/",
+            json={"records": [{"id": k, "fields": v} for k, v in records.items()]},
+        )
+        return resp.json()
+
+    async def upsert_records(
+        self,
+        table_id: str,
+        records: list[dict[str, Any]],
+        key_columns: list[str] | None = None,
+        batch_size: int | None = None,
+    ) -> None:
+        """Add records, or update the existing ones matching on the key columns."""
+
+        for batch in batched(records, batch_size or settings.GRIST_API_BATCH_SIZE):
+            await self._client.put(
+                f"docs/{self.doc_id}/tables/{table_id}/records/",
+                json=upsert_payload(records=batch, key_columns=key_columns or ["object_id"]),
+            )
@@ -1,31 +1,174 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections.abc import AsyncGenerator, Generator
 from typing import Any
 
 from django.conf import settings
-from httpx import Auth, Client, Request, Response
+from django.core.cache import BaseCache, caches
+from httpx import (
+    AsyncBaseTransport,
+    AsyncClient,
+    AsyncHTTPTransport,
+    Auth,
+    BaseTransport,
+    Client,
+    HTTPTransport,
+    Request,
+    Response,
+)
+
+from .throttling import AsyncThrottledTransport, RetryPolicy, ThrottledTransport, get_bucket
+
+# Fallback lifetimes, when they can't be read from the tokens themselves
+ACCESS_TOKEN_LIFETIME = 5 * 60
+REFRESH_TOKEN_LIFETIME = 24 * 60 * 60
+
+RETRY_ON_401 = "recoco_retry_on_401"
+TOKEN_REQUEST = "recoco_token_request"
+
+_token_locks: dict[str, threading.Lock] = {}
+
+
+def _token_expiry(token: str, default_lifetime: int) -> float:
+    """Read the expiry timestamp from a JWT token payload, without verifying it."""
+
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return time.time() + default_lifetime
+
+
+class RecocoTokenStore:
+    """
+    Recoco API tokens shared by all the clients of a given API URL and username.
+
+    Tokens are kept in a Django cache (in-process by default, or shared between
+    processes with a Redis cache), and are considered expired a few seconds
+    before their actual expiry, so that they are renewed proactively.
+    """
+
+    def __init__(self, api_url: str, username: str):
+        digest = hashlib.sha256(f"{api_url}:{username}".encode()).hexdigest()
+        self.key = f"recoco-api-tokens:{digest}"
+
+    @property
+    def cache(self) -> BaseCache:
+        return caches[settings.RECOCO_API_TOKEN_CACHE]
+
+    @property
+    def lock(self) -> threading.Lock:
+        return _token_locks.setdefault(self.key, threading.Lock())
+
+    def _get_valid_token(self, name: str) -> str | None:
+        tokens = self.cache.get(self.key) or {}
+        if tokens.get(f"{name}_expires_at", 0) - settings.RECOCO_API_TOKEN_MARGIN > time.time():
+            return tokens[name]
+        return None
+
+    def get_access_token(self) -> str | None:
+        return self._get_valid_token("access")
+
+    def pop_refresh_token(self) -> str | None:
+        if (refresh_token := self._get_valid_token("refresh")) is not None:
+            self.cache.delete(self.key)
+        return refresh_token
+
+    def save(self, payload: dict[str, Any], refresh_token: str | None = None) -> str:
+        tokens = {
+            "access": payload["access"],
+            "access_expires_at": _token_expiry(payload["access"], ACCESS_TOKEN_LIFETIME),
+        }
+        if refresh_token := payload.get("refresh", refresh_token):
+            tokens["refresh"] = refresh_token
+            tokens["refresh_expires_at"] = _token_expiry(refresh_token, REFRESH_TOKEN_LIFETIME)
+
+        expires_at = max(tokens["access_expires_at"], tokens.get("refresh_expires_at", 0))
+        self.cache.set(self.key, tokens, timeout=max(int(expires_at - time.time()), 1))
+        return tokens["access"]
 
 
 class RecocoApiAuth(Auth):
-    requires_response_body = True
-    access_token: str = None
-    refresh_token: str = None
-
-    def auth_flow(self, request: Request):
-        if self.access_token is None:
-            token_response = yield self._build_token_request()
-            self._update_tokens(token_response)
-            request.headers["Authorization"] = f"Bearer {self.access_token}"
-            yield request
-
-        request.headers["Authorization"] = f"Bearer {self.access_token}"
-        response = yield request
-
-        if response.status_code == 401:
-            refresh_response = yield self._build_refresh_request()
-            self._update_tokens(refresh_response)
-            request.headers["Authorization"] = f"Bearer {self.access_token}"
-            yield request
+    """
+    Token authentication flow for Recoco API.
+
+    Tokens are read from a shared store, so that a login is only needed when no
+    valid token is available. Token renewals are serialised, and a rejected
+    access token triggers a single renewal before the request is sent again.
+    """
+
+    def __init__(self):
+        self.store = RecocoTokenStore(
+            api_url=settings.RECOCO_API_URL,
+            username=settings.RECOCO_API_USERNAME,
+        )
+        self._async_lock = asyncio.Lock()
+
+    def sync_auth_flow(self, request: Request) -> Generator[Request, Response, None]:
+        rejected_token = None
+        for _ in range(2):
+            with self.store.lock:
+                flow = self._token_flow(rejected_token=rejected_token)
+                try:
+                    token_request = next(flow)
+                    while True:
+                        token_response = yield token_request
+                        token_response.read()
+                        token_request = flow.send(token_response)
+                except StopIteration as stop:
+                    access_token = stop.value
+
+            request.headers["Authorization"] = f"Bearer {access_token}"
+            request.extensions[RETRY_ON_401] = rejected_token is None
+            response = yield request
+            if response.status_code != 401:
+                return
+            rejected_token = access_token
+
+    async def async_auth_flow(self, request: Request) -> AsyncGenerator[Request, Response]:
+        rejected_token = None
+        for _ in range(2):
+            async with self._async_lock:
+                flow = self._token_flow(rejected_token=rejected_token)
+                try:
+                    token_request = next(flow)
+                    while True:
+                        token_response = yield token_request
+                        await token_response.aread()
+                        token_request = flow.send(token_response)
+                except StopIteration as stop:
+                    access_token = stop.value
+
+            request.headers["Authorization"] = f"Bearer {access_token}"
+            request.extensions[RETRY_ON_401] = rejected_token is None
+            response = yield request
+            if response.status_code != 401:
+                return
+            rejected_token = access_token
+
+    def _token_flow(self, rejected_token: str | None = None) -> Generator[Request, Response, str]:
+        """Yield token requests until a valid access token is obtained, and return it."""
+
+        access_token = self.store.get_access_token()
+        if access_token is not None and access_token != rejected_token:
+            return access_token
+
+        if (refresh_token := self.store.pop_refresh_token()) is not None:
+            refresh_response = yield self._build_refresh_request(refresh_token)
+            if refresh_response.is_success:
+                return self.store.save(refresh_response.json(), refresh_token=refresh_token)
+
+        # falls back to a login when the refresh token has expired or been revoked
+        token_response = yield self._build_token_request()
+        token_response.raise_for_status()
+        return self.store.save(token_response.json())
 
     def _build_token_request(self):
         return Request(
@@ -35,33 +178,55 @@ class RecocoApiAuth(Auth):
                 "username": settings.RECOCO_API_USERNAME,
                 "password": settings.RECOCO_API_PASSWORD,
             },
+            extensions={TOKEN_REQUEST: True},
         )
 
-    def _build_refresh_request(self):
+    def _build_refresh_request(self, refresh_token: str):
         return Request(
             "POST",
             f"{settings.RECOCO_API_URL}/token/refresh/",
             data={
-                "refresh": self.refresh_token,
+                "refresh": refresh_token,
             },
+            extensions={TOKEN_REQUEST: True},
         )
 
-    def _update_tokens(self, response: Response):
-        payload = response.json()
-        self.access_token = payload["access"]
-        if "refresh" in payload:
-            self.refresh_token = payload["refresh"]
-
 
 def raise_on_4xx_5xx(response: Response):
+    # the token responses are checked by the auth flow itself
+    if response.request.extensions.get(TOKEN_REQUEST):
+        return
+    # the auth flow renews the token and sends the request again
+    if response.status_code == 401 and response.request.extensions.get(RETRY_ON_401):
+        return
     response.raise_for_status()
 
 
+async def araise_on_4xx_5xx(response: Response):
+    raise_on_4xx_5xx(response)
+
+
+def _throttling_options() -> dict[str, Any]:
+    return {
+        "bucket": get_bucket(
+            settings.RECOCO_API_URL,
+            rate=settings.RECOCO_API_RATE_LIMIT,
+            burst=settings.RECOCO_API_RATE_BURST,
+        ),
+        "policy": RetryPolicy(
+            max_retries=settings.RECOCO_API_MAX_RETRIES,
+            backoff_base=settings.HTTP_BACKOFF_BASE,
+            backoff_max=settings.HTTP_BACKOFF_MAX,
+        ),
+    }
+
+
 class RecocoApiClient:
     _client: Client
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, transport: BaseTransport | None = None, **kwargs):
         self._client = Client(
+            transport=ThrottledTransport(transport or HTTPTransport(), **_throttling_options()),
             auth=RecocoApiAuth(),
             base_url=settings.RECOCO_API_URL,
             event_hooks={"response": [raise_on_4xx_5xx]},
@@ -72,6 +237,27 @@ class RecocoApiClient:
         response = self._client.get("/projects/")
         return response.json()
 
+    def iter_projects(self, page_size: int | None = None) -> Generator[dict[str, Any]]:
+        """Iterate over all projects, following the pagination links page by page."""
+
+        response = self._client.get(
+            "/projects/",
+            params={"page_size": page_size or settings.RECOCO_API_PAGE_SIZE},
+        )
+        while True:
+            payload = response.json()
+
+            # the endpoint is not paginated, the whole list has been returned
+            if isinstance(payload, list):
+                yield from payload
+                return
+
+            yield from payload["results"]
+
+            if not (next_url := payload.get("next")):
+                return
+            response = self._client.get(next_url)
+
     def get_project(self, project_id: int) -> dict[str, Any]:
         response = self._client.get(f"/projects/{project_id}/")
         return response.json()
@@ -83,3 +269,60 @@ class RecocoApiClient:
     def get_survey_session_answers(self, session_id: int) -> dict[str, Any]:
         response = self._client.get(f"/survey/sessions/{session_id}/answers/")
         return response.json()
+
+
+class AsyncRecocoApiClient:
+    _client: AsyncClient
+
+    def __init__(self, *args, transport: AsyncBaseTransport | None = None, **kwargs):
+        self._client = AsyncClient(
+            transport=AsyncThrottledTransport(
+                transport or AsyncHTTPTransport(), **_throttling_options()
+            ),
+            auth=RecocoApiAuth(),
+            base_url=settings.RECOCO_API_URL,
+            event_hooks={"response": [araise_on_4xx_5xx]},
+            **kwargs,
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def get_projects(self) -> dict[str, Any]:
+        response = await self._client.get("/projects/")
+        return response.json()
+
+    async def iter_projects(self, page_size: int | None = None) -> AsyncGenerator[dict[str, Any]]:
+        """Iterate over all projects, following the pagination links page by page."""
+
+        response = await self._client.get(
+            "/projects/",
+            params={"page_size": page_size or settings.RECOCO_API_PAGE_SIZE},
+        )
+        while True:
+            payload = response.json()
+
+            # the endpoint is not paginated, the whole list has been returned
+            if isinstance(payload, list):
+                for project in payload:
+                    yield project
+                return
+
+            for project in payload["results"]:
+                yield project
+
+            if not (next_url := payload.get("next")):
+                return
+            response = await self._client.get(next_url)
+
+    async def get_project(self, project_id: int) -> dict[str, Any]:
+        response = await self._client.get(f"/projects/{project_id}/")
+        return response.json()
+
+    async def get_survey_sessions(self, project_id: int) -> dict[str, Any]:
+        response = await self._client.get(f"/survey/sessions/?project_id={project_id}")
+        return response.json()
+
+    async def get_survey_session_answers(self, session_id: int) -> dict[str, Any]:
+        response = await self._client.get(f"/survey/sessions/{session_id}/answers/")
+        return response.json()
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from django.utils import timezone
+from httpx import (
+    AsyncBaseTransport,
+    BaseTransport,
+    Request,
+    Response,
+    TransportError,
+)
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# statuses worth a retry, a 429 meaning the request has not been handled at all
+RETRY_ALL_STATUSES = frozenset({429})
+RETRY_IDEMPOTENT_STATUSES = frozenset({502, 503, 504})
+
+_buckets: dict[tuple[str, str | None], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+_stats: dict[str, dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all the clients of a same host, refilled at `rate`
+    requests per second up to `burst` tokens. It is paused altogether when the
+    host asks to retry later.
+    """
+
+    def __init__(self, rate: float | None, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, and return the delay to wait before using it."""
+
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._paused_until - now)
+            if not self.rate:
+                return delay
+
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                delay = max(delay, -self._tokens / self.rate)
+            return delay
+
+    def pause(self, delay: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+
+def get_bucket(url: str, rate: float | None, burst: int, scope: str | None = None) -> TokenBucket:
+    """
+    Get the token bucket of the host of a URL, updated with the given rate. A
+    scope gets a bucket of its own, instead of the one shared by the whole host.
+    """
+
+    key = (urlsplit(url).netloc, scope)
+    with _buckets_lock:
+        if (bucket := _buckets.get(key)) is None:
+            bucket = _buckets[key] = TokenBucket(rate=rate, burst=burst)
+        bucket.rate, bucket.burst = rate, burst
+    return bucket
+
+
+def get_throttling_stats() -> dict[str, dict[str, float]]:
+    """Time spent waiting for the rate limiter or a retry, and number of retries, by host."""
+
+    with _stats_lock:
+        return {host: dict(stats) for host, stats in _stats.items()}
+
+
+def pop_throttling_stats() -> dict[str, dict[str, float]]:
+    """Same as `get_throttling_stats`, the stats being reset."""
+
+    with _stats_lock:
+        stats = {host: dict(host_stats) for host, host_stats in _stats.items()}
+        _stats.clear()
+    return stats
+
+
+def _record(host: str, waited: float = 0.0, retries: int = 0) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(host, {"throttled_seconds": 0.0, "retries": 0})
+        stats["throttled_seconds"] += waited
+        stats["retries"] += retries
+
+
+def retry_after(response: Response) -> float | None:
+    """Read the delay asked by a `Retry-After` header, in seconds or as an HTTP date."""
+
+    if (value := response.headers.get("Retry-After")) is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, unless the response tells how long to wait."""
+
+    def __init__(self, max_retries: int, backoff_base: float, backoff_max: float):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def should_retry(self, request: Request, response: Response, attempt: int) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if response.status_code in RETRY_ALL_STATUSES:
+            return True
+        return (
+            response.status_code in RETRY_IDEMPOTENT_STATUSES
+            and request.method in IDEMPOTENT_METHODS
+        )
+
+    def should_retry_error(self, request: Request, attempt: int) -> bool:
+        return attempt < self.max_retries and request.method in IDEMPOTENT_METHODS
+
+    def delay(self, response: Response | None, attempt: int) -> float:
+        if response is not None and (delay := retry_after(response)) is not None:
+            return min(delay, self.backoff_max)
+        return self.backoff(attempt)
+
+
+class ThrottledTransport(BaseTransport):
+    """Transport sending the requests at the rate of a token bucket, and retrying them."""
+
+    def __init__(self, transport: BaseTransport, bucket: TokenBucket, policy: RetryPolicy):
+        self._transport = transport
+        self._bucket = bucket
+        self._policy = policy
+
+    def handle_request(self, request: Request) -> Response:
+        host = request.url.netloc.decode()
+        attempt = 0
+        while True:
+            if (delay := self._bucket.reserve()) > 0:
+                _record(host, waited=delay)
+                time.sleep(delay)
+
+            try:
+                response = self._transport.handle_request(request)
+            except TransportError:
+                if not self._policy.should_retry_error(request, attempt):
+                    raise
+                response = None
+            else:
+                if not self._policy.should_retry(request, response, attempt):
+                    return response
+                response.read()
+                response.close()
+
+            delay = self._policy.delay(response, attempt)
+            if response is not None and response.status_code == 429:
+                self._bucket.pause(delay)
+            logger.info(f"Retrying {request.method} {request.url} in {delay:.1f}s")
+            _record(host, waited=delay, retries=1)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncThrottledTransport(AsyncBaseTransport):
+    """Transport sending the requests at the rate of a token bucket, and retrying them."""
+
+    def __init__(self, transport: AsyncBaseTransport, bucket: TokenBucket, policy: RetryPolicy):
+        self._transport = transport
+        self._bucket = bucket
+        self._policy = policy
+
+    async def handle_async_request(self, request: Request) -> Response:
+        host = request.url.netloc.decode()
+        attempt = 0
+        while True:
+            if (delay := self._bucket.reserve()) > 0:
+                _record(host, waited=delay)
+                await asyncio.sleep(delay)
+
+            try:
+                response = await self._transport.handle_async_request(request)
+            except TransportError:
+                if not self._policy.should_retry_error(request, attempt):
+                    raise
+                response = None
+            else:
+                if not self._policy.should_retry(request, response, attempt):
+                    return response
+                await response.aread()
+                await response.aclose()
+
+            delay = self._policy.delay(response, attempt)
+            if response is not None and response.status_code == 429:
+                self._bucket.pause(delay)
+            logger.info(f"Retrying {request.method} {request.url} in {delay:.1f}s")
+            _record(host, waited=delay, retries=1)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
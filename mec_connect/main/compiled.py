@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Any, Self, assert_never
+from uuid import UUID
+
+from .choices import FilterOperator, GristColumnType, SurveyAnswerStrategy
+from .constants import default_survey_answers_spec
+from .models import GristColumnFilter, GristConfig
+from .utils import str2bool
+
+logger = logging.getLogger(__name__)
+
+_compiled_configs: dict[UUID, CompiledGristConfig] = {}
+_compiled_configs_lock = threading.Lock()
+
+
+def _cast_function(column_type: GristColumnType) -> Callable[[Any], Any]:
+    match column_type:
+        case GristColumnType.BOOL:
+            return lambda value: value if isinstance(value, bool) else str2bool(str(value))
+        case GristColumnType.INTEGER:
+            return int
+        case GristColumnType.NUMERIC:
+            return float
+        case GristColumnType.TEXT | GristColumnType.CHOICE | GristColumnType.CHOICE_LIST:
+            return str
+        case _:
+            raise ValueError(f"Unhandled column type: {column_type}")
+
+
+def _compare_function(operator: FilterOperator, filter_value: Any) -> Callable[[Any], bool]:
+    match operator:
+        case FilterOperator.EQUAL:
+            return lambda value: value == filter_value
+        case FilterOperator.I_EQUAL:
+            lower_filter_value = filter_value.lower()
+            return lambda value: value.lower() == lower_filter_value
+        case FilterOperator.NOT_EQUAL:
+            return lambda value: value != filter_value
+        case FilterOperator.I_NOT_EQUAL:
+            lower_filter_value = filter_value.lower()
+            return lambda value: value.lower() != lower_filter_value
+        case FilterOperator.CONTAINS:
+            return lambda value: filter_value in value
+        case FilterOperator.I_CONTAINS:
+            lower_filter_value = filter_value.lower()
+            return lambda value: lower_filter_value in value.lower()
+        case _:
+            assert_never(operator)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledFilter:
+    """A column filter compiled into a predicate, with its value cast once for all."""
+
+    col_id: str
+    group: int
+    predicate: Callable[[Any], bool]
+
+    @classmethod
+    def from_filter(cls, column_filter: GristColumnFilter) -> Self:
+        try:
+            cast = _cast_function(column_filter.grist_column.type)
+            compare = _compare_function(
+                operator=column_filter.filter_operator,
+                filter_value=cast(column_filter.filter_value),
+            )
+        except (AttributeError, ValueError):
+            return cls(
+                col_id=column_filter.grist_column.col_id,
+                group=column_filter.filter_group,
+                predicate=lambda value: False,
+            )
+
+        def predicate(value: Any) -> bool:
+            try:
+                return compare(cast(value))
+            except (AttributeError, TypeError, ValueError):
+                return False
+
+        return cls(
+            col_id=column_filter.grist_column.col_id,
+            group=column_filter.filter_group,
+            predicate=predicate,
+        )
+
+    def check_object(self, obj: dict[str, Any]) -> bool:
+        if self.col_id not in obj:
+            return False
+        return self.predicate(obj[self.col_id])
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledFilters:
+    """
+    Column filters of a config: the filters of a same group are combined with AND,
+    and the groups are combined with OR. An object always matches when there is
+    no filter at all.
+    """
+
+    groups: tuple[tuple[CompiledFilter, ...], ...] = ()
+
+    @classmethod
+    def from_filters(cls, column_filters: Sequence[GristColumnFilter]) -> Self:
+        groups: dict[int, list[CompiledFilter]] = {}
+        for column_filter in column_filters:
+            compiled_filter = CompiledFilter.from_filter(column_filter)
+            groups.setdefault(compiled_filter.group, []).append(compiled_filter)
+        return cls(groups=tuple(tuple(groups[k]) for k in sorted(groups)))
+
+    def __len__(self) -> int:
+        return sum(len(group) for group in self.groups)
+
+    def check_object(self, obj: dict[str, Any]) -> bool:
+        if not len(self.groups):
+            return True
+        return any(all(f.check_object(obj) for f in group) for group in self.groups)
+
+    def may_match(self, obj: dict[str, Any], columns: frozenset[str]) -> bool:
+        """
+        Check an object partially, against the filters on the given columns only.
+        It may not match the other filters, but it surely doesn't match all the
+        filters if this check fails.
+        """
+
+        if not len(self.groups):
+            return True
+        return any(
+            all(f.check_object(obj) for f in group if f.col_id in columns) for group in self.groups
+        )
+
+    def check_objects(self, objs: Sequence[dict[str, Any]]) -> list[bool]:
+        """Check a batch of objects, filter by filter, and return the mask of the matching ones."""
+
+        if not len(self.groups):
+            return [True] * len(objs)
+
+        mask = [False] * len(objs)
+        for group in self.groups:
+            group_mask = [not m for m in mask]
+            for f in group:
+                col_id, predicate = f.col_id, f.predicate
+                group_mask = [
+                    m and col_id in obj and predicate(obj[col_id])
+                    for m, obj in zip(group_mask, objs, strict=True)
+                ]
+            mask = [m or g for m, g in zip(mask, group_mask, strict=True)]
+        return mask
+
+
+def _survey_answer_getters(
+    strategy: SurveyAnswerStrategy, column: str
+) -> list[tuple[str, Callable[[dict[str, Any]], Any]]]:
+    match strategy:
+        case SurveyAnswerStrategy.CHOICES:
+            return [
+                (column, lambda obj: ",".join([c["text"] for c in obj["choices"]])),
+                (f"{column}_comment", itemgetter("comment")),
+            ]
+        case SurveyAnswerStrategy.COMMENT:
+            return [(column, itemgetter("comment"))]
+        case SurveyAnswerStrategy.ATTACHMENT:
+            return [
+                (column, itemgetter("comment")),
+                (f"{column}_attachment", itemgetter("attachment")),
+            ]
+        case SurveyAnswerStrategy.BOOLEAN:
+            return [(column, lambda obj: obj["values"][0] == "Oui")]
+        case SurveyAnswerStrategy.FLOAT:
+            return [(column, lambda obj: float(obj["comment"]))]
+        case _:
+            assert_never(strategy)
+
+
+def _no_survey_answer_columns(obj: dict[str, Any]) -> dict[str, Any]:
+    return {}
+
+
+def compile_survey_answers_spec(
+    spec: Mapping[str, Mapping[str, str]], headers: frozenset[str]
+) -> Mapping[str, Callable[[dict[str, Any]], dict[str, Any]]]:
+    """
+    Compile a survey answers mapping into extractor functions by question slug,
+    each one returning the values of the given columns only.
+    """
+
+    extractors = {}
+    for slug, question_spec in spec.items():
+        try:
+            getters = _survey_answer_getters(
+                strategy=SurveyAnswerStrategy(question_spec["strategy"]),
+                column=question_spec["column"],
+            )
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Invalid survey answer mapping for question {slug}")
+            continue
+
+        if not len(getters := [(col, getter) for col, getter in getters if col in headers]):
+            extractors[slug] = _no_survey_answer_columns
+            continue
+
+        def extractor(obj, getters=getters):
+            data = {}
+            for col, getter in getters:
+                try:
+                    data[col] = getter(obj)
+                except (IndexError, TypeError, ValueError):
+                    pass
+            return data
+
+        extractors[slug] = extractor
+
+    return MappingProxyType(extractors)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledGristConfig:
+    """
+    Immutable snapshot of a Grist configuration, with its columns and filters,
+    used in the sync hot path instead of querying the database again and again.
+    """
+
+    id: UUID
+    version: datetime
+
+    name: str | None
+    doc_id: str
+    table_id: str
+    enabled: bool
+
+    api_base_url: str
+    api_key: str
+    api_rate_limit: float | None
+    api_max_retries: int | None
+
+    table_columns: tuple[Mapping[str, Any], ...]
+    table_headers: frozenset[str]
+    column_types: Mapping[str, GristColumnType]
+    filters: CompiledFilters
+    survey_answer_extractors: Mapping[str, Callable[[dict[str, Any]], dict[str, Any]]]
+
+    @property
+    def pk(self) -> UUID:
+        return self.id
+
+    @classmethod
+    def from_config(cls, config: GristConfig) -> Self:
+        column_configs = list(config.column_configs.select_related("grist_column"))
+        table_headers = frozenset(col_config.grist_column.col_id for col_config in column_configs)
+
+        return cls(
+            id=config.id,
+            version=config.modified,
+            name=config.name,
+            doc_id=config.doc_id,
+            table_id=config.table_id,
+            enabled=config.enabled,
+            api_base_url=config.api_base_url,
+            api_key=config.api_key,
+            api_rate_limit=config.api_rate_limit,
+            api_max_retries=config.api_max_retries,
+            table_columns=tuple(
+                MappingProxyType(
+                    {
+                        "id": col_config.grist_column.col_id,
+                        "fields": MappingProxyType(
+                            {
+                                "label": col_config.grist_column.label,
+                                "type": GristColumnType(col_config.grist_column.type).label,
+                            }
+                        ),
+                    }
+                )
+                for col_config in column_configs
+            ),
+            table_headers=table_headers,
+            column_types=MappingProxyType(
+                {
+                    col_config.grist_column.col_id: GristColumnType(col_config.grist_column.type)
+                    for col_config in column_configs
+                }
+            ),
+            filters=CompiledFilters.from_filters(
+                config.column_filters.select_related("grist_column")
+            ),
+            survey_answer_extractors=compile_survey_answers_spec(
+                spec=default_survey_answers_spec | config.survey_answers_spec,
+                headers=table_headers,
+            ),
+        )
+
+    def table_columns_spec(self) -> list[dict[str, Any]]:
+        """Columns as expected by the Grist API."""
+
+        return [{"id": col["id"], "fields": dict(col["fields"])} for col in self.table_columns]
+
+    def __str__(self) -> str:
+        return self.name or self.doc_id
+
+
+def compile_config(config: GristConfig) -> CompiledGristConfig:
+    """
+    Get the compiled snapshot of a config, built again only when the config,
+    its columns or its filters have been modified since it was last compiled.
+    """
+
+    with _compiled_configs_lock:
+        compiled = _compiled_configs.get(config.id)
+    if compiled is not None and compiled.version == config.modified:
+        return compiled
+
+    compiled = CompiledGristConfig.from_config(config)
+    with _compiled_configs_lock:
+        _compiled_configs[config.id] = compiled
+    return compiled
@@ -1,6 +1,23 @@
 from __future__ import annotations
 
-from .choices import GristColumnType
+from .choices import GristColumnType, SurveyAnswerStrategy
+
+# Columns mapped from the project payload itself, the other ones being mapped from
+# the project survey answers
+project_columns = frozenset(
+    (
+        "object_id",
+        "name",
+        "context",
+        "city",
+        "postal_code",
+        "insee",
+        "department",
+        "department_code",
+        "location",
+        "tags",
+    )
+)
 
 default_columns_spec = {
     "object_id": {
@@ -144,3 +161,72 @@ default_columns_spec = {
         "type": GristColumnType.TEXT,
     },
 }
+
+# Survey answers mapping, by question slug: the column the answer is mapped to,
+# and the strategy used to extract its value(s)
+default_survey_answers_spec = {
+    "autres-programmes-et-contrats": {
+        "column": "dependencies",
+        "strategy": SurveyAnswerStrategy.CHOICES,
+    },
+    "boussole": {
+        "column": "ecological_transition_compass",
+        "strategy": SurveyAnswerStrategy.COMMENT,
+    },
+    "budget-previsionnel": {
+        "column": "budget",
+        "strategy": SurveyAnswerStrategy.FLOAT,
+    },
+    "calendrier": {
+        "column": "calendar",
+        "strategy": SurveyAnswerStrategy.ATTACHMENT,
+    },
+    "description-de-laction": {
+        "column": "action",
+        "strategy": SurveyAnswerStrategy.COMMENT,
+    },
+    "diagnostic-anct": {
+        "column": "diagnostic_anct",
+        "strategy": SurveyAnswerStrategy.ATTACHMENT,
+    },
+    "indicateurs-de-suivi-et-deval": {
+        "column": "evaluation_indicator",
+        "strategy": SurveyAnswerStrategy.COMMENT,
+    },
+    "maitre-douvrage-2": {
+        "column": "ownership",
+        "strategy": SurveyAnswerStrategy.COMMENT,
+    },
+    "maturite-du-projet": {
+        "column": "maturity",
+        "strategy": SurveyAnswerStrategy.CHOICES,
+    },
+    "partage-a-la-commune": {
+        "column": "diagnostic_is_shared",
+        "strategy": SurveyAnswerStrategy.BOOLEAN,
+    },
+    "partenaires-2": {
+        "column": "partners",
+        "strategy": SurveyAnswerStrategy.COMMENT,
+    },
+    "perimetre": {
+        "column": "perimeter",
+        "strategy": SurveyAnswerStrategy.CHOICES,
+    },
+    "plan-de-financement-definitif": {
+        "column": "final_financing_plan",
+        "strategy": SurveyAnswerStrategy.ATTACHMENT,
+    },
+    "plan-de-financement-previsionnel": {
+        "column": "forecast_financing_plan",
+        "strategy": SurveyAnswerStrategy.ATTACHMENT,
+    },
+    "procedures-administratives": {
+        "column": "administrative_procedures",
+        "strategy": SurveyAnswerStrategy.COMMENT,
+    },
+    "thematiques-2": {
+        "column": "topics",
+        "strategy": SurveyAnswerStrategy.CHOICES,
+    },
+}
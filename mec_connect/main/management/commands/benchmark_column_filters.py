@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import random
+import timeit
+
+from django.core.management.base import BaseCommand, CommandParser
+from main.choices import FilterOperator, GristColumnType
+from main.compiled import CompiledFilters
+from main.models import GristColumn, GristColumnFilter
+from main.services import filter_projects_data
+
+
+class Command(BaseCommand):
+    help = "Compare the column filters evaluation with and without compilation"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        rows = [
+            (
+                i,
+                {
+                    "name": f"Projet {i}",
+                    "department_code": rnd.randint(1, 95),
+                    "tags": ",".join(rnd.sample(["eau", "voirie", "ecole", "sante"], k=2)),
+                    "location": rnd.choice(["centre bourg", "Centre Bourg", "zone"]),
+                },
+            )
+            for i in range(options["rows"])
+        ]
+
+        # the columns are set in memory, without the lazy loading done in production
+        column_filters = [
+            GristColumnFilter(
+                grist_column=GristColumn(col_id=col_id, type=col_type),
+                filter_value=filter_value,
+                filter_operator=filter_operator,
+            )
+            for col_id, col_type, filter_value, filter_operator in (
+                ("department_code", GristColumnType.INTEGER, "44", FilterOperator.NOT_EQUAL),
+                ("tags", GristColumnType.TEXT, "EAU", FilterOperator.I_CONTAINS),
+                ("location", GristColumnType.TEXT, "centre bourg", FilterOperator.I_EQUAL),
+            )
+        ]
+        compiled_filters = CompiledFilters.from_filters(column_filters)
+
+        def _legacy():
+            return [
+                item
+                for item in rows
+                if all(column_filter.check_object(item[1]) for column_filter in column_filters)
+            ]
+
+        def _compiled():
+            return [item for item in rows if compiled_filters.check_object(item[1])]
+
+        def _compiled_batches():
+            return list(filter_projects_data(filters=compiled_filters, projects_data=rows))
+
+        expected = _legacy()
+        for name, func in (
+            ("GristColumnFilter.check_object", _legacy),
+            ("CompiledFilters.check_object", _compiled),
+            ("CompiledFilters.check_objects", _compiled_batches),
+        ):
+            assert func() == expected, name
+            duration = min(timeit.repeat(func, number=1, repeat=options["repeat"]))
+            self.stdout.write(f"{name:<32} {duration * 1000:8.1f} ms ({len(expected)} rows kept)")
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import statistics
+import time
+import uuid
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+
+class Command(BaseCommand):
+    help = "Send signed webhook events to a running server, and report throughput and latency"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--url", default="http://localhost:8002/api/webhook")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        # events of an unknown type are not processed, they are only stored
+        parser.add_argument("--object-type", default="loadtest.Object")
+
+    def _signed_request(self, object_type: str, object_id: int) -> tuple[dict[str, str], bytes]:
+        body = json.dumps(
+            {
+                "topic": f"{object_type}/update",
+                "object": {"id": object_id},
+                "object_type": object_type,
+                "webhook_uuid": str(uuid.uuid4()),
+            }
+        ).encode()
+        timestamp = str(int(time.time()))
+        signature = hmac.new(
+            key=settings.WEBHOOK_SECRET.encode(),
+            msg=timestamp.encode() + b":" + body,
+            digestmod=hashlib.sha256,
+        ).hexdigest()
+        return {
+            "content-type": "application/json",
+            "Django-Webhook-Request-Timestamp": timestamp,
+            "Django-Webhook-Signature-v1": signature,
+        }, body
+
+    async def _run(self, options) -> tuple[list[float], int, float]:
+        latencies: list[float] = []
+        errors = 0
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for i in range(options["requests"]):
+            queue.put_nowait(i)
+
+        async def _worker(client: httpx.AsyncClient):
+            nonlocal errors
+            while not queue.empty():
+                headers, body = self._signed_request(options["object_type"], queue.get_nowait())
+                started = time.perf_counter()
+                try:
+                    response = await client.post(options["url"], headers=headers, content=body)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(_worker(client) for _ in range(options["concurrency"])))
+            elapsed = time.perf_counter() - started
+
+        return latencies, errors, elapsed
+
+    def handle(self, *args, **options):
+        latencies, errors, elapsed = asyncio.run(self._run(options))
+
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{len(latencies)} requests ({errors} errors) in {elapsed:.2f}s: "
+            f"{len(latencies) / elapsed:.1f} req/s, "
+            f"p50 {quantiles[49] * 1000:.1f}ms, p99 {quantiles[98] * 1000:.1f}ms"
+        )
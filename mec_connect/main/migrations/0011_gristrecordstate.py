@@ -0,0 +1,76 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:26
+from __future__ import annotations
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0010_gristcolumnfilter_filter_operator_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GristRecordState",
+            fields=[
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="modified"
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "object_id",
+                    models.IntegerField(help_text="ID of the project related to the record"),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(
+                        help_text="Hash of the whole content last written in the record",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "fields_hashes",
+                    models.JSONField(
+                        default=dict, help_text="Hash of each field last written in the record"
+                    ),
+                ),
+                (
+                    "grist_config",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="record_states",
+                        to="main.gristconfig",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Grist record state",
+                "verbose_name_plural": "Grist record states",
+                "db_table": "gristrecordstate",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("grist_config", "object_id"), name="unique_grist_record_state"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:27
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0011_gristrecordstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="project_id",
+            field=models.IntegerField(
+                blank=True, help_text="ID of the project related to the object", null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                fields=["project_id", "status"], name="webhookeven_project_9c416b_idx"
+            ),
+        ),
+    ]
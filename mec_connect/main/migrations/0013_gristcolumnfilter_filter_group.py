@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:29
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0012_webhookevent_project_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gristcolumnfilter",
+            name="filter_group",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Filters of a same group must all match, and at least one group must match",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:31
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0013_gristcolumnfilter_filter_group"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gristconfig",
+            name="survey_answers_spec",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text='Survey answers mapping overriding the default one, by question slug, e.g. {"question-slug": {"column": "col_id", "strategy": "comment"}}',
+            ),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:34
+from __future__ import annotations
+
+import functools
+import uuid
+
+import django.core.serializers.json
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0014_gristconfig_survey_answers_spec"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecocoProject",
+            fields=[
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="modified"
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "project_id",
+                    models.IntegerField(help_text="ID of the project in Recoco", unique=True),
+                ),
+                (
+                    "payload",
+                    models.JSONField(
+                        default=dict,
+                        encoder=functools.partial(
+                            django.core.serializers.json.DjangoJSONEncoder,
+                            *(),
+                            **{"indent": 2, "sort_keys": True},
+                        ),
+                    ),
+                ),
+                (
+                    "survey_answers",
+                    models.JSONField(
+                        default=list,
+                        encoder=functools.partial(
+                            django.core.serializers.json.DjangoJSONEncoder,
+                            *(),
+                            **{"indent": 2, "sort_keys": True},
+                        ),
+                    ),
+                ),
+                (
+                    "updated_on",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Last update of the project in Recoco, when it was mirrored",
+                        null=True,
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(
+                        help_text="Hash of the mirrored payload and survey answers", max_length=64
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Recoco project",
+                "verbose_name_plural": "Recoco projects",
+                "db_table": "recocoproject",
+                "ordering": ("project_id",),
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:35
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0015_recocoproject"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gristconfig",
+            name="synced_until",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Latest Recoco update of the projects synced incrementally",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:38
+from __future__ import annotations
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0016_gristconfig_synced_until"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncJob",
+            fields=[
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="modified"
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("POPULATE", "Populate"), ("REFRESH", "Refresh")], max_length=32
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("RUNNING", "Running"), ("DONE", "Done"), ("FAILED", "Failed")],
+                        default="RUNNING",
+                        max_length=32,
+                    ),
+                ),
+                (
+                    "cursor",
+                    models.IntegerField(
+                        blank=True,
+                        help_text="ID of the last processed project, where the job resumes",
+                        null=True,
+                    ),
+                ),
+                ("processed_projects", models.PositiveIntegerField(default=0)),
+                ("written_records", models.PositiveIntegerField(default=0)),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                ("exception", models.TextField(blank=True)),
+                (
+                    "grist_config",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sync_jobs",
+                        to="main.gristconfig",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Sync job",
+                "verbose_name_plural": "Sync jobs",
+                "db_table": "syncjob",
+                "ordering": ("-created",),
+                "indexes": [
+                    models.Index(
+                        fields=["grist_config", "kind", "status"], name="syncjob_grist_c_768857_idx"
+                    )
+                ],
+            },
+        ),
+    ]
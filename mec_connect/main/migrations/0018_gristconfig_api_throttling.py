@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:40
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0017_syncjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gristconfig",
+            name="api_max_retries",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text="Retries of a throttled or failed request, the default one when empty",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="gristconfig",
+            name="api_rate_limit",
+            field=models.FloatField(
+                blank=True,
+                help_text="Requests per second to the Grist host, the default one when empty",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:43
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0018_gristconfig_api_throttling"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="webhookevent",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Pending"),
+                    ("PROCESSING", "Processing"),
+                    ("PROCESSED", "Processed"),
+                    ("INVALID", "Invalid"),
+                    ("FAILED", "Failed"),
+                ],
+                default="PENDING",
+                help_text="Whether or not the webhook event has been successfully processed",
+                max_length=32,
+            ),
+        ),
+    ]
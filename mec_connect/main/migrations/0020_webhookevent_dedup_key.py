@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:49
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0019_webhookevent_status_processing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="dedup_key",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Hash of the delivered payload, the same for the retries of a delivery",
+                max_length=64,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:58
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0020_webhookevent_dedup_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Number of times the webhook event has been claimed for processing",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from django.db import migrations
+
+
+def _resolve_project_id(event) -> int | None:
+    # same as WebhookEvent.resolve_project_id, not available on the historical model
+    match event.object_type:
+        case "projects.Project" | "taggit.TaggedItem":
+            project_id = event.object_id
+        case "survey.Answer":
+            project_id = (event.payload or {}).get("object", {}).get("project")
+        case _:
+            return None
+
+    try:
+        return int(project_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def backfill_project_id(apps, schema_editor):
+    WebhookEvent = apps.get_model("main", "WebhookEvent")
+
+    # only the events still to be processed, the others are never read again
+    events = []
+    for event in WebhookEvent.objects.filter(
+        project_id__isnull=True, status__in=["PENDING", "PROCESSING"]
+    ).iterator(chunk_size=1000):
+        if (project_id := _resolve_project_id(event)) is not None:
+            event.project_id = project_id
+            events.append(event)
+
+    WebhookEvent.objects.bulk_update(events, ["project_id"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0021_webhookevent_attempts"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_project_id, migrations.RunPython.noop),
+    ]
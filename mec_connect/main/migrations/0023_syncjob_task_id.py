@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-17 20:27
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0022_webhookevent_backfill_project_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="syncjob",
+            name="task_id",
+            field=models.CharField(
+                blank=True,
+                help_text="ID of the task running the job, which resumes it when delivered again",
+                max_length=64,
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-17 20:30
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0023_syncjob_task_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="dedup_window",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Time window of the delivery, only the retries within it being dropped",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="webhookevent",
+            name="dedup_key",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Hash of the delivered payload, the same for the retries of a delivery",
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="webhookevent",
+            constraint=models.UniqueConstraint(
+                fields=("dedup_key", "dedup_window"), name="unique_webhook_event_delivery"
+            ),
+        ),
+    ]
@@ -1,18 +1,33 @@
 from __future__ import annotations
 
+import hashlib
+import json
+from copy import deepcopy
+from datetime import timedelta
 from typing import Any, Self, assert_never
+from uuid import UUID
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
-from django.core.handlers.wsgi import WSGIRequest
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
-from django.db import models
+from django.db import models, transaction
+from django.http import HttpRequest
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from mec_connect.utils.json import PrettyJSONEncoder
 from mec_connect.utils.models import BaseModel
 
-from .choices import FilterOperator, GristColumnType, ObjectType, WebhookEventStatus
+from .choices import (
+    FilterOperator,
+    GristColumnType,
+    ObjectType,
+    SurveyAnswerStrategy,
+    SyncJobKind,
+    SyncJobStatus,
+    WebhookEventStatus,
+)
 from .managers import UserManager
 from .utils import str2bool
 
@@ -36,6 +51,26 @@ class WebhookEvent(BaseModel):
         help_text="Type of the object that triggered the webhook event",
     )
 
+    project_id = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="ID of the project related to the object",
+    )
+
+    dedup_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Hash of the delivered payload, the same for the retries of a delivery",
+    )
+    dedup_window = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Time window of the delivery, only the retries within it being dropped",
+    )
+
     remote_ip = models.GenericIPAddressField(help_text="IP address of the request client.")
     headers = models.JSONField(default=dict)
     payload = models.JSONField(default=dict, encoder=PrettyJSONEncoder)
@@ -47,6 +82,10 @@ class WebhookEvent(BaseModel):
         help_text="Whether or not the webhook event has been successfully processed",
     )
 
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Number of times the webhook event has been claimed for processing",
+    )
     exception = models.TextField(blank=True)
     traceback = models.TextField(
         blank=True,
@@ -58,19 +97,164 @@ class WebhookEvent(BaseModel):
         verbose_name_plural = "Webhook Events"
         db_table = "webhookevent"
         ordering = ("-created",)
+        indexes = [
+            models.Index(fields=["project_id", "status"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key", "dedup_window"],
+                name="unique_webhook_event_delivery",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.project_id is None:
+            self.project_id = self.resolve_project_id()
+        return super().save(*args, **kwargs)
 
     @property
     def object_data(self) -> dict[str, Any]:
         return self.payload.get("object", {})
 
+    def resolve_project_id(self) -> int | None:
+        match self.object_type:
+            case ObjectType.PROJECT | ObjectType.TAGGEDITEM:
+                project_id = self.object_id
+            case ObjectType.SURVEY_ANSWER:
+                project_id = self.object_data.get("project")
+            case _:
+                return None
+
+        try:
+            return int(project_id)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def dedup_key_from_payload(payload: dict[str, Any]) -> str:
+        """Key identifying a delivery, a retry of the same delivery having the same key."""
+
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    payload["webhook_uuid"],
+                    payload["object_type"],
+                    payload["object"]["id"],
+                    payload,
+                ],
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def current_dedup_window() -> int | None:
+        """
+        Time window of the deliveries received now, None when the retries are not
+        dropped. A same payload delivered again later on, after its object went
+        through another state and back, is in another window and is kept.
+        """
+
+        if not settings.WEBHOOK_DEDUP_WINDOW:
+            return None
+        return int(timezone.now().timestamp()) // settings.WEBHOOK_DEDUP_WINDOW
+
     @classmethod
-    def create_from_request(cls, request: WSGIRequest, **kwargs: dict[str, Any]) -> Self:
-        return cls.objects.create(
+    def fields_from_payload(cls, payload: dict[str, Any]) -> dict[str, Any]:
+        """Map a webhook payload to the fields of an event, the whole payload being kept."""
+
+        data = deepcopy(payload)
+        data["payload"] = deepcopy(payload)
+        data["object_id"] = data.pop("object")["id"]
+        data["dedup_key"] = cls.dedup_key_from_payload(payload)
+        data["dedup_window"] = cls.current_dedup_window()
+        return data
+
+    @classmethod
+    def build_from_request(cls, request: HttpRequest, payloads: list[dict[str, Any]]) -> list[Self]:
+        return cls.build_events(
             remote_ip=request.META.get("REMOTE_ADDR", "0.0.0.0"),
             headers=dict(request.headers),
-            **kwargs,
+            payloads=payloads,
         )
 
+    @classmethod
+    def build_events(
+        cls, remote_ip: str, headers: dict[str, str], payloads: list[dict[str, Any]]
+    ) -> list[Self]:
+        events = [
+            cls(remote_ip=remote_ip, headers=headers, **cls.fields_from_payload(payload))
+            for payload in payloads
+        ]
+        for event in events:
+            # not set by save(), bypassed by bulk_create()
+            event.project_id = event.resolve_project_id()
+        return events
+
+    @classmethod
+    def insert_new(cls, events: list[Self]) -> list[Self]:
+        """
+        Insert events with an `ON CONFLICT DO NOTHING`, and return the ones actually
+        inserted, the others being duplicates of already delivered events.
+        """
+
+        cls.objects.bulk_create(events, ignore_conflicts=True)
+        inserted = set(
+            cls.objects.filter(id__in=[event.id for event in events]).values_list("id", flat=True)
+        )
+        return [event for event in events if event.id in inserted]
+
+    @classmethod
+    async def ainsert_new(cls, events: list[Self]) -> list[Self]:
+        await cls.objects.abulk_create(events, ignore_conflicts=True)
+        inserted = {
+            pk
+            async for pk in cls.objects.filter(id__in=[event.id for event in events]).values_list(
+                "id", flat=True
+            )
+        }
+        return [event for event in events if event.id in inserted]
+
+    @classmethod
+    def create_from_request(
+        cls, request: HttpRequest, payload: dict[str, Any]
+    ) -> tuple[Self, bool]:
+        """
+        Create the event of a delivery, unless it is a retry of an already delivered
+        one. Return the event, and whether it has been created.
+        """
+
+        (event,) = cls.build_from_request(request, payloads=[payload])
+        if len(cls.insert_new([event])):
+            return event, True
+        return cls.objects.get(dedup_key=event.dedup_key, dedup_window=event.dedup_window), False
+
+    @classmethod
+    async def acreate_from_request(
+        cls, request: HttpRequest, payload: dict[str, Any]
+    ) -> tuple[Self, bool]:
+        (event,) = cls.build_from_request(request, payloads=[payload])
+        if len(await cls.ainsert_new([event])):
+            return event, True
+        return (
+            await cls.objects.aget(dedup_key=event.dedup_key, dedup_window=event.dedup_window),
+            False,
+        )
+
+    @classmethod
+    def bulk_create_from_request(
+        cls, request: HttpRequest, payloads: list[dict[str, Any]]
+    ) -> list[Self]:
+        """Create the events of a batch of deliveries, except the already delivered ones."""
+
+        return cls.insert_new(cls.build_from_request(request, payloads=payloads))
+
+    @classmethod
+    async def abulk_create_from_request(
+        cls, request: HttpRequest, payloads: list[dict[str, Any]]
+    ) -> list[Self]:
+        return await cls.ainsert_new(cls.build_from_request(request, payloads=payloads))
+
 
 class GristConfig(BaseModel):
     name = models.CharField(max_length=255, blank=True, null=True)
@@ -81,6 +265,31 @@ class GristConfig(BaseModel):
 
     api_base_url = models.CharField(max_length=128)
     api_key = models.CharField(max_length=64)
+    api_rate_limit = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Requests per second to the Grist host, the default one when empty",
+    )
+    api_max_retries = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        help_text="Retries of a throttled or failed request, the default one when empty",
+    )
+
+    synced_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Latest Recoco update of the projects synced incrementally",
+    )
+
+    survey_answers_spec = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text=(
+            "Survey answers mapping overriding the default one, by question slug, "
+            'e.g. {"question-slug": {"column": "col_id", "strategy": "comment"}}'
+        ),
+    )
 
     class Meta:
         db_table = "gristconfig"
@@ -91,6 +300,20 @@ class GristConfig(BaseModel):
             models.Index(fields=["enabled"]),
         ]
 
+    def clean(self):
+        super().clean()
+        if not isinstance(self.survey_answers_spec, dict):
+            raise ValidationError({"survey_answers_spec": "Must be an object"})
+        for slug, spec in self.survey_answers_spec.items():
+            if (
+                not isinstance(spec, dict)
+                or not isinstance(spec.get("column"), str)
+                or spec.get("strategy") not in SurveyAnswerStrategy.values
+            ):
+                raise ValidationError(
+                    {"survey_answers_spec": f"Invalid mapping for question {slug}"}
+                )
+
     @property
     def table_columns(self) -> list[dict[str, Any]]:
         return [
@@ -167,6 +390,11 @@ class GristColumnFilter(BaseModel):
         max_length=32, choices=FilterOperator.choices, default=FilterOperator.EQUAL
     )
 
+    filter_group = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Filters of a same group must all match, and at least one group must match",
+    )
+
     class Meta:
         db_table = "gristcolumnfilter"
         verbose_name = "Grist column filter"
@@ -224,6 +452,152 @@ class GristColumnFilter(BaseModel):
                 raise ValueError(f"Unhandled column type: {self.grist_column.type}")
 
 
+class GristRecordState(BaseModel):
+    grist_config = models.ForeignKey(
+        GristConfig, on_delete=models.CASCADE, related_name="record_states"
+    )
+    object_id = models.IntegerField(help_text="ID of the project related to the record")
+
+    content_hash = models.CharField(
+        max_length=64,
+        help_text="Hash of the whole content last written in the record",
+    )
+    fields_hashes = models.JSONField(
+        default=dict,
+        help_text="Hash of each field last written in the record",
+    )
+
+    class Meta:
+        db_table = "gristrecordstate"
+        verbose_name = "Grist record state"
+        verbose_name_plural = "Grist record states"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["grist_config", "object_id"],
+                name="unique_grist_record_state",
+            ),
+        ]
+
+
+class SyncJob(BaseModel):
+    grist_config = models.ForeignKey(
+        GristConfig, on_delete=models.CASCADE, related_name="sync_jobs"
+    )
+    kind = models.CharField(max_length=32, choices=SyncJobKind.choices)
+    status = models.CharField(
+        max_length=32, choices=SyncJobStatus.choices, default=SyncJobStatus.RUNNING
+    )
+
+    cursor = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="ID of the last processed project, where the job resumes",
+    )
+    processed_projects = models.PositiveIntegerField(default=0)
+    written_records = models.PositiveIntegerField(default=0)
+
+    task_id = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="ID of the task running the job, which resumes it when delivered again",
+    )
+
+    finished = models.DateTimeField(null=True, blank=True)
+    exception = models.TextField(blank=True)
+
+    class Meta:
+        db_table = "syncjob"
+        ordering = ("-created",)
+        verbose_name = "Sync job"
+        verbose_name_plural = "Sync jobs"
+        indexes = [
+            models.Index(fields=["grist_config", "kind", "status"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} {self.grist_config}"
+
+    @classmethod
+    def resume_or_create(
+        cls, grist_config_id: UUID, kind: SyncJobKind, task_id: str | None = None
+    ) -> tuple[Self | None, bool]:
+        """
+        Resume the running job of a config when its task is delivered again, or when
+        it has made no progress for too long, its worker having died. Otherwise,
+        create a new job, a failed job being started again from scratch.
+
+        Return the job, or None when another task is running it, and whether the
+        job is resumed.
+        """
+
+        stale = timezone.now() - timedelta(seconds=settings.SYNC_JOB_TIMEOUT)
+        with transaction.atomic():
+            # the jobs of a config are started one at a time
+            GristConfig.objects.select_for_update().filter(id=grist_config_id).first()
+            job = (
+                cls.objects.select_for_update()
+                .filter(grist_config_id=grist_config_id, kind=kind, status=SyncJobStatus.RUNNING)
+                .first()
+            )
+            if job is None:
+                job = cls.objects.create(
+                    grist_config_id=grist_config_id, kind=kind, task_id=task_id or ""
+                )
+                return job, False
+
+            if (not task_id or job.task_id != task_id) and job.modified >= stale:
+                return None, False
+
+            job.task_id = task_id or ""
+            job.exception = ""
+            job.save()
+            return job, True
+
+    def add_progress(self, projects: int = 0, records: int = 0, cursor: int | None = None):
+        fields = {
+            "processed_projects": models.F("processed_projects") + projects,
+            "written_records": models.F("written_records") + records,
+            "modified": timezone.now(),
+        }
+        if cursor is not None:
+            fields["cursor"] = cursor
+        self.__class__.objects.filter(id=self.id).update(**fields)
+
+    def finish(self, status: SyncJobStatus, exception: str = ""):
+        self.__class__.objects.filter(id=self.id).update(
+            status=status,
+            exception=exception,
+            finished=timezone.now() if status == SyncJobStatus.DONE else None,
+            modified=timezone.now(),
+        )
+
+
+class RecocoProject(BaseModel):
+    project_id = models.IntegerField(unique=True, help_text="ID of the project in Recoco")
+
+    payload = models.JSONField(default=dict, encoder=PrettyJSONEncoder)
+    survey_answers = models.JSONField(default=list, encoder=PrettyJSONEncoder)
+
+    updated_on = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Last update of the project in Recoco, when it was mirrored",
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        help_text="Hash of the mirrored payload and survey answers",
+    )
+
+    class Meta:
+        db_table = "recocoproject"
+        ordering = ("project_id",)
+        verbose_name = "Recoco project"
+        verbose_name_plural = "Recoco projects"
+
+    def __str__(self) -> str:
+        return f"#{self.project_id}"
+
+
 class User(BaseModel, AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from typing import Any
+from uuid import UUID
 
 from ninja import Schema
 
@@ -10,3 +11,13 @@ class WebhookEventSchema(Schema):
     object: dict[str, Any]
     object_type: str
     webhook_uuid: str
+
+
+class WebhookEventStatusSchema(Schema):
+    id: UUID | str
+    status: str
+
+
+class WebhookEventBatchStatusSchema(Schema):
+    ids: list[UUID]
+    status: str
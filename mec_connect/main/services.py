@@ -1,82 +1,540 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import logging
-from collections.abc import Generator
+from collections.abc import Callable, Generator, Iterable
+from datetime import datetime
+from functools import partial
+from itertools import batched
 from typing import Any
 
-from .clients import GristApiClient, RecocoApiClient
-from .constants import default_columns_spec
-from .models import GristColumn, GristColumnFilter, GristConfig, GritColumnConfig
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from httpx import HTTPError
+
+from .clients import AsyncRecocoApiClient, GristApiClient, RecocoApiClient
+from .compiled import CompiledFilters, CompiledGristConfig
+from .constants import default_columns_spec, project_columns
+from .models import (
+    GristColumn,
+    GristConfig,
+    GristRecordState,
+    GritColumnConfig,
+    RecocoProject,
+)
+from .utils import ordered_concurrent_map
 
 logger = logging.getLogger(__name__)
 
 
-def update_or_create_project_record(config: GristConfig, project_id: int, project_data: dict):
+def hash_record_fields(data: dict[str, Any]) -> dict[str, str]:
+    """Hash each field of a record, to detect the changes between two writes."""
+
+    return {
+        k: hashlib.blake2b(
+            json.dumps(v, sort_keys=True, default=str).encode(), digest_size=16
+        ).hexdigest()
+        for k, v in data.items()
+    }
+
+
+def get_changed_fields(
+    data: dict[str, Any], fields_hashes: dict[str, str] | None
+) -> dict[str, Any]:
+    """Keep the fields of a record which changed since it was last written."""
+
+    if fields_hashes is None:
+        return data
+    return {k: data[k] for k, h in hash_record_fields(data).items() if fields_hashes.get(k) != h}
+
+
+def get_record_states(config: CompiledGristConfig) -> dict[int, dict[str, str]]:
+    """Map the project IDs to the fields hashes of their last written record."""
+
+    return dict(
+        GristRecordState.objects.filter(grist_config_id=config.id).values_list(
+            "object_id", "fields_hashes"
+        )
+    )
+
+
+def save_record_states(config: CompiledGristConfig, records: dict[int, dict[str, Any]]) -> None:
+    """Save the hashes of records which have just been written, by project ID."""
+
+    states = []
+    for project_id, project_data in records.items():
+        fields_hashes = hash_record_fields(project_data)
+        states.append(
+            GristRecordState(
+                grist_config_id=config.id,
+                object_id=project_id,
+                fields_hashes=fields_hashes,
+                content_hash=hashlib.sha256(
+                    json.dumps(fields_hashes, sort_keys=True).encode()
+                ).hexdigest(),
+            )
+        )
+
+    GristRecordState.objects.bulk_create(
+        states,
+        update_conflicts=True,
+        unique_fields=["grist_config", "object_id"],
+        update_fields=["fields_hashes", "content_hash", "modified"],
+    )
+
+
+def update_or_create_project_record(
+    config: CompiledGristConfig, project_id: int, project_data: dict
+):
     """
     Update a record related to a givent project, in a Grist table,
     or create it if it doesn't exist.
+
+    Only the fields which changed since the last write are sent, and nothing
+    is sent at all if the record is unchanged.
     """
 
-    client = GristApiClient.from_config(config)
+    upsert_project_records(config=config, projects_data={project_id: project_data})
+
+
+def get_changed_records(
+    config: CompiledGristConfig, projects_data: dict[int, dict]
+) -> dict[int, dict[str, Any]]:
+    """
+    Return the fields of the given projects records which changed since the last
+    write, the unchanged records being left out.
+    """
+
+    records_states = dict(
+        GristRecordState.objects.filter(
+            grist_config_id=config.id, object_id__in=list(projects_data)
+        ).values_list("object_id", "fields_hashes")
+    )
+
+    changed_records = {}
+    for project_id, project_data in projects_data.items():
+        fields_hashes = records_states.get(project_id)
+        changed_data = get_changed_fields(project_data, fields_hashes=fields_hashes)
+        if fields_hashes is not None and not len(changed_data):
+            logger.info(f"Record of project #{project_id} unchanged in table {config.table_id}")
+            continue
+        changed_records[project_id] = changed_data
+    return changed_records
+
+
+def get_partial_record_ids(
+    changed_records: dict[int, dict[str, Any]], projects_data: dict[int, dict]
+) -> list[int]:
+    return [k for k, v in changed_records.items() if len(v) < len(projects_data[k])]
+
+
+def restore_missing_records(
+    config: CompiledGristConfig,
+    changed_records: dict[int, dict[str, Any]],
+    projects_data: dict[int, dict],
+    records: list[dict[str, Any]],
+) -> None:
+    """Send whole the partial records missing from the table, to create them again."""
+
+    existing_ids = {r["fields"]["object_id"] for r in records}
+    for project_id in get_partial_record_ids(changed_records, projects_data):
+        if project_id not in existing_ids:
+            logger.info(f"Record of project #{project_id} missing in table {config.table_id}")
+            changed_records[project_id] = projects_data[project_id]
+
+
+def upsert_project_records(config: CompiledGristConfig, projects_data: dict[int, dict]) -> None:
+    """
+    Update the records related to the given projects in a Grist table, or create
+    them, matching them on the project ID, so that row IDs are not needed.
 
-    resp = client.get_records(
-        table_id=config.table_id,
-        filter={"object_id": [project_id]},
+    Only the fields which changed since the last write are sent, the records
+    sharing the same changed fields being sent in the same requests. Records
+    which have been deleted from the table since are sent whole, as the upsert
+    creates them again.
+    """
+
+    changed_records = get_changed_records(config=config, projects_data=projects_data)
+    if not len(changed_records):
+        return
+
+    upsert_changed_records(
+        config=config, changed_records=changed_records, projects_data=projects_data
     )
+    save_record_states(config=config, records={k: projects_data[k] for k in changed_records})
+
+
+def upsert_changed_records(
+    config: CompiledGristConfig,
+    changed_records: dict[int, dict[str, Any]],
+    projects_data: dict[int, dict],
+) -> None:
+    """Grist requests of `upsert_project_records`, without any database access."""
+
+    client = GristApiClient.from_config(config)
+
+    if partial_ids := get_partial_record_ids(changed_records, projects_data):
+        resp = client.get_records(table_id=config.table_id, filter={"object_id": partial_ids})
+        restore_missing_records(config, changed_records, projects_data, records=resp["records"])
 
-    if len(records := resp["records"]):
-        client.update_records(
+    # records upserted in the same request must have the same fields
+    for batch in group_records_by_fields(changed_records.items()):
+        client.upsert_records(
             table_id=config.table_id,
-            records={
-                records[0]["id"]: project_data,
-            },
+            records=[{"object_id": k} | v for k, v in batch.items()],
         )
-        return
 
-    client.create_records(
-        table_id=config.table_id,
-        records=[{"object_id": project_id} | project_data],
+
+def upsert_configs_project_records(
+    configs_projects_data: list[tuple[CompiledGristConfig, dict[int, dict]]],
+) -> list[HTTPError | None]:
+    """
+    Upsert the records of the given projects in the table of each config, as
+    `upsert_project_records` does, the tables being written concurrently by a
+    pool of threads. Only the Grist requests are run in the threads, the record
+    states being read before and saved after.
+
+    Return, for each config, the HTTP error which prevented its records from being
+    written, or None. Any other exception is raised.
+    """
+
+    changed_records = [
+        get_changed_records(config=config, projects_data=projects_data)
+        for config, projects_data in configs_projects_data
+    ]
+    items = [
+        (config, changed, projects_data)
+        for (config, projects_data), changed in zip(
+            configs_projects_data, changed_records, strict=True
+        )
+        if len(changed)
+    ]
+
+    def _upsert(item: tuple[CompiledGristConfig, dict, dict]) -> HTTPError | None:
+        config, changed, projects_data = item
+        try:
+            upsert_changed_records(
+                config=config, changed_records=changed, projects_data=projects_data
+            )
+        except HTTPError as exc:
+            return exc
+        return None
+
+    results = iter(
+        list(
+            ordered_concurrent_map(
+                _upsert, items, max_workers=min(len(items), settings.GRIST_API_MAX_CONNECTIONS)
+            )
+        )
     )
+    errors = []
+    for (config, projects_data), changed in zip(
+        configs_projects_data, changed_records, strict=True
+    ):
+        if not len(changed):
+            errors.append(None)
+            continue
+        if (error := next(results)) is None:
+            save_record_states(config=config, records={k: projects_data[k] for k in changed})
+        errors.append(error)
+    return errors
+
+
+def get_project_record_ids(config: CompiledGristConfig) -> dict[int, int]:
+    """Map the project IDs to the IDs of their records in a Grist table."""
+
+    resp = GristApiClient.from_config(config).get_records(table_id=config.table_id)
+    return {r["fields"]["object_id"]: r["id"] for r in resp["records"]}
+
+
+def update_or_create_project_records(
+    config: CompiledGristConfig,
+    projects_data: Iterable[tuple[int, dict[str, Any]]],
+    batch_size: int | None = None,
+    on_flush: Callable[[int], None] | None = None,
+) -> None:
+    """
+    Update the records related to the given projects in a Grist table, and create
+    the missing ones, in batches.
 
+    Only the fields which changed since the last write are updated, and the
+    unchanged records are skipped. `on_flush` is called with the number of
+    written records once each batch is written, all the projects consumed so
+    far being then handled.
+    """
 
-def fetch_projects_data(
-    config: GristConfig, project_ids: list[int] | None = None
-) -> Generator[tuple[int, dict]]:
-    """Fetch data related to projects from Recoco API."""
+    client = GristApiClient.from_config(config)
+    batch_size = batch_size or settings.GRIST_API_BATCH_SIZE
+
+    record_ids = get_project_record_ids(config)
+    record_states = get_record_states(config)
+
+    records_to_update: dict[int, tuple[int, dict[str, Any]]] = {}
+    records_to_create: dict[int, dict[str, Any]] = {}
+    written_records: dict[int, dict[str, Any]] = {}
+
+    def _flush(min_size: int):
+        if len(written_records) < min_size:
+            return
+
+        # records updated in the same request must have the same fields
+        for batch in group_records_by_fields(records_to_update.values()):
+            client.update_records(table_id=config.table_id, records=batch)
+        records_to_update.clear()
+
+        if len(records_to_create) > 0:
+            client.create_records(
+                table_id=config.table_id,
+                records=[{"object_id": k} | v for k, v in records_to_create.items()],
+            )
+            records_to_create.clear()
+
+        save_record_states(config=config, records=written_records)
+        if on_flush is not None:
+            on_flush(len(written_records))
+        written_records.clear()
+
+    for project_id, project_data in projects_data:
+        if (record_id := record_ids.get(project_id)) is not None:
+            changed_data = get_changed_fields(project_data, record_states.get(project_id))
+            if not len(changed_data):
+                continue
+            records_to_update[project_id] = (record_id, changed_data)
+        else:
+            records_to_create[project_id] = project_data
+
+        written_records[project_id] = project_data
+        _flush(min_size=batch_size)
+
+    _flush(min_size=1)
+
+
+def group_records_by_fields(
+    records: Iterable[tuple[int, dict[str, Any]]],
+) -> list[dict[int, dict[str, Any]]]:
+    """Group records by ID into batches sharing the same set of fields."""
+
+    groups: dict[tuple[str, ...], dict[int, dict[str, Any]]] = {}
+    for record_id, fields in records:
+        groups.setdefault(tuple(sorted(fields)), {})[record_id] = fields
+    return list(groups.values())
+
+
+def get_project_updated_on(project: dict[str, Any]) -> datetime | None:
+    if not isinstance(updated_on := project.get("updated_on"), str):
+        return None
+    try:
+        return parse_datetime(updated_on)
+    except ValueError:
+        return None
+
+
+def is_updated_since(project: dict[str, Any], since: datetime | None) -> bool:
+    """Check if a project has been updated since a given date, when it is known."""
+
+    if since is None or (updated_on := get_project_updated_on(project)) is None:
+        return True
+    return updated_on > since
+
+
+def get_mirrored_answers(projects: Iterable[dict[str, Any]]) -> dict[int, list[dict[str, Any]]]:
+    """
+    Get the mirrored survey answers of the projects which have not been updated
+    in Recoco since they were mirrored, by project ID.
+    """
+
+    updated_on = {project["id"]: get_project_updated_on(project) for project in projects}
+
+    return {
+        project_id: survey_answers
+        for project_id, mirror_updated_on, survey_answers in RecocoProject.objects.filter(
+            project_id__in=[k for k, v in updated_on.items() if v is not None]
+        ).values_list("project_id", "updated_on", "survey_answers")
+        if mirror_updated_on is not None and updated_on[project_id] <= mirror_updated_on
+    }
+
+
+def save_mirrored_projects(payloads: Iterable[tuple[dict[str, Any], list[dict[str, Any]]]]) -> None:
+    """Save raw project payloads and their survey answers in the local mirror."""
+
+    RecocoProject.objects.bulk_create(
+        [
+            RecocoProject(
+                project_id=project["id"],
+                payload=project,
+                survey_answers=answers,
+                updated_on=get_project_updated_on(project),
+                content_hash=hashlib.sha256(
+                    json.dumps([project, answers], sort_keys=True, default=str).encode()
+                ).hexdigest(),
+            )
+            for project, answers in payloads
+        ],
+        update_conflicts=True,
+        unique_fields=["project_id"],
+        update_fields=["payload", "survey_answers", "updated_on", "content_hash", "modified"],
+    )
+
+
+async def afetch_projects(
+    project_ids: list[int], errors: dict[int, HTTPError] | None = None
+) -> list[dict[str, Any]]:
+    """
+    Fetch the given projects from Recoco API concurrently, at most
+    `RECOCO_API_CONCURRENCY` at a time, in the same order.
+
+    When `errors` is given, the projects which can't be fetched are left out and
+    their errors are stored in it by project ID, instead of being raised.
+    """
+
+    recoco_client = AsyncRecocoApiClient()
+    semaphore = asyncio.Semaphore(settings.RECOCO_API_CONCURRENCY)
+
+    async def _fetch(project_id: int) -> dict[str, Any]:
+        async with semaphore:
+            return await recoco_client.get_project(project_id=project_id)
+
+    try:
+        results = await asyncio.gather(
+            *(_fetch(project_id) for project_id in project_ids),
+            return_exceptions=errors is not None,
+        )
+    finally:
+        await recoco_client.aclose()
+
+    projects = []
+    for project_id, result in zip(project_ids, results, strict=True):
+        if isinstance(result, HTTPError) and errors is not None:
+            errors[project_id] = result
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            projects.append(result)
+    return projects
+
+
+def fetch_projects_payloads(
+    project_ids: list[int] | None = None,
+    *,
+    projects: Iterable[dict[str, Any]] | None = None,
+    keep_project: Callable[[dict[str, Any]], bool] | None = None,
+    with_survey: bool = True,
+    fetch_errors: dict[int, HTTPError] | None = None,
+) -> Generator[tuple[dict[str, Any], list[dict[str, Any]]]]:
+    """
+    Fetch raw project payloads and their survey answers from Recoco API,
+    independently of any Grist configuration. Projects already listed can be
+    given as `projects`, so that only their survey answers are fetched.
+
+    Projects rejected by `keep_project` are dropped before any survey call, and
+    survey calls are skipped altogether when `with_survey` is False. Projects are
+    fetched by ID, then enriched with their survey answers, concurrently, the
+    output order being the same as the projects order.
+
+    Survey answers are kept in a local mirror: when listing all the projects, the
+    answers of a project which has not been updated since it was mirrored are read
+    from the mirror instead of being fetched again. Projects fetched by ID are
+    always fetched again, as they are related to webhook events. When
+    `fetch_errors` is given, those which can't be fetched are skipped, their
+    errors being stored in it by project ID.
+    """
 
     recoco_client = RecocoApiClient()
 
     if project_ids:
-        projects = [recoco_client.get_project(project_id=project_id) for project_id in project_ids]
-    else:
-        projects = recoco_client.get_projects()
+        projects = asyncio.run(afetch_projects(project_ids=project_ids, errors=fetch_errors))
+    elif projects is None:
+        projects = recoco_client.iter_projects()
 
-    for project in projects:
-        project_data = map_from_project_payload_object(obj=project, config=config)
+    if keep_project is not None:
+        projects = filter(keep_project, projects)
 
+    if not with_survey:
+        yield from ((project, []) for project in projects)
+        return
+
+    def _fetch_answers(project: dict[str, Any]) -> tuple[dict[str, Any], list[dict[str, Any]]]:
         sessions = recoco_client.get_survey_sessions(project_id=project["id"])
-        if sessions["count"] > 0:
-            answers = recoco_client.get_survey_session_answers(
-                session_id=sessions["results"][0]["id"]
+        if sessions["count"] == 0:
+            return project, []
+        answers = recoco_client.get_survey_session_answers(session_id=sessions["results"][0]["id"])
+        return project, answers["results"]
+
+    for chunk in batched(projects, settings.RECOCO_API_PAGE_SIZE):
+        mirrored_answers = get_mirrored_answers(chunk) if not project_ids else {}
+
+        fetched_payloads = list(
+            ordered_concurrent_map(
+                _fetch_answers,
+                [project for project in chunk if project["id"] not in mirrored_answers],
+                max_workers=settings.RECOCO_API_CONCURRENCY,
             )
-            for answer in answers["results"]:
-                project_data.update(
-                    map_from_survey_answer_payload_object(obj=answer, config=config)
-                )
+        )
+        if len(fetched_payloads):
+            save_mirrored_projects(fetched_payloads)
+
+        answers_by_id = mirrored_answers | {project["id"]: a for project, a in fetched_payloads}
+        yield from ((project, answers_by_id[project["id"]]) for project in chunk)
+
+
+def requires_survey(config: CompiledGristConfig) -> bool:
+    """Check if some columns of a config are mapped from the survey answers."""
+
+    return not config.table_headers <= project_columns
+
+
+def project_may_match(config: CompiledGristConfig, project: dict[str, Any]) -> bool:
+    """
+    Check a raw project payload against the filters of a config on the project
+    columns only, the ones on survey columns being checked once the project is
+    enriched with its answers.
+    """
+
+    return config.filters.may_match(
+        map_from_project_payload_object(obj=project, config=config),
+        columns=project_columns,
+    )
 
-        yield project["id"], project_data
 
+def map_project_data(
+    config: CompiledGristConfig, project: dict[str, Any], answers: list[dict[str, Any]]
+) -> dict[str, Any]:
+    """Map a raw project payload and its survey answers respecting a Grist configuration."""
+
+    project_data = map_from_project_payload_object(obj=project, config=config)
+    for answer in answers:
+        project_data.update(map_from_survey_answer_payload_object(obj=answer, config=config))
+    return project_data
 
-def grist_table_exists(config: GristConfig) -> bool:
+
+def fetch_projects_data(
+    config: CompiledGristConfig,
+    project_ids: list[int] | None = None,
+    projects: Iterable[dict[str, Any]] | None = None,
+) -> Generator[tuple[int, dict]]:
+    """Fetch data related to projects from Recoco API."""
+
+    for project, answers in fetch_projects_payloads(
+        project_ids=project_ids,
+        projects=projects,
+        keep_project=partial(project_may_match, config),
+        with_survey=requires_survey(config),
+    ):
+        yield project["id"], map_project_data(config=config, project=project, answers=answers)
+
+
+def grist_table_exists(config: CompiledGristConfig) -> bool:
     """Check if a table exists in Grist."""
 
     return GristApiClient.from_config(config).table_exists(table_id=config.table_id)
 
 
-def check_table_columns_consistency(config: GristConfig) -> bool:
+def check_table_columns_consistency(config: CompiledGristConfig) -> bool:
     """Check the columns of a table in Grist are consistent with the config."""
 
-    config_table_columns = config.table_columns
+    config_table_columns = config.table_columns_spec()
     config_table_columns_keys = [t["id"] for t in config_table_columns]
 
     remote_table_columns = GristApiClient.from_config(config).get_table_columns(
@@ -93,14 +551,25 @@ def check_table_columns_consistency(config: GristConfig) -> bool:
     )
 
 
-def check_column_filters(filters: list[GristColumnFilter], obj: dict[str, Any]) -> bool:
-    for filter in filters:
-        if not filter.check_object(obj):
-            return False
-    return True
+def check_column_filters(filters: CompiledFilters, obj: dict[str, Any]) -> bool:
+    return filters.check_object(obj)
+
+
+def filter_projects_data(
+    filters: CompiledFilters,
+    projects_data: Iterable[tuple[int, dict[str, Any]]],
+    batch_size: int | None = None,
+) -> Generator[tuple[int, dict[str, Any]]]:
+    """Keep the projects data matching the column filters, checked batch by batch."""
 
+    for batch in batched(projects_data, batch_size or settings.GRIST_API_BATCH_SIZE):
+        mask = filters.check_objects([project_data for _, project_data in batch])
+        yield from (item for item, match in zip(batch, mask, strict=True) if match)
 
-def map_from_project_payload_object(obj: dict[str, Any], config: GristConfig) -> dict[str, Any]:
+
+def map_from_project_payload_object(
+    obj: dict[str, Any], config: CompiledGristConfig
+) -> dict[str, Any]:
     """Map a project payload object respecting a Grist configuration."""
 
     if not len(available_keys := config.table_headers):
@@ -119,95 +588,22 @@ def map_from_project_payload_object(obj: dict[str, Any], config: GristConfig) ->
             "tags": ",".join(obj["tags"]),
         }
     except (KeyError, ValueError) as exc:
-        logger.error(f"Error while mapping project #{obj["id"]} payload object: {exc}")
+        logger.error(f"Error while mapping project #{obj['id']} payload object: {exc}")
         return {}
 
-    return {k: data[k] for k in available_keys if k in data}
+    return {k: v for k, v in data.items() if k in available_keys}
 
 
-def map_from_survey_answer_payload_object(  # noqa: C901
-    obj: dict[str, Any], config: GristConfig
+def map_from_survey_answer_payload_object(
+    obj: dict[str, Any], config: CompiledGristConfig
 ) -> dict[str, Any]:
     """Map a survey answer payload object respecting a Grist configuration."""
 
-    def _format_choices(_obj):
-        return ",".join([c["text"] for c in _obj["choices"]])
-
-    if not len(available_keys := config.table_headers):
+    if (extractor := config.survey_answer_extractors.get(obj["question"]["slug"])) is None:
+        logger.info(f"Unhandled question: {obj['question']['text_short']}")
         return {}
 
-    data = {}
-
-    map_question_slugs_columns = {
-        "autres-programmes-et-contrats": "dependencies",
-        "boussole": "ecological_transition_compass",
-        "budget-previsionnel": "budget",
-        "calendrier": "calendar",
-        "description-de-laction": "action",
-        "diagnostic-anct": "diagnostic_anct",
-        "indicateurs-de-suivi-et-deval": "evaluation_indicator",
-        "maitre-douvrage-2": "ownership",
-        "maturite-du-projet": "maturity",
-        "partage-a-la-commune": "diagnostic_is_shared",
-        "partenaires-2": "partners",
-        "perimetre": "perimeter",
-        "plan-de-financement-definitif": "final_financing_plan",
-        "plan-de-financement-previsionnel": "forecast_financing_plan",
-        "procedures-administratives": "administrative_procedures",
-        "thematiques-2": "topics",
-    }
-
-    match question_slug := obj["question"]["slug"]:
-        case "thematiques-2" | "autres-programmes-et-contrats" | "perimetre" | "maturite-du-projet":
-            data.update(
-                {
-                    map_question_slugs_columns[question_slug]: _format_choices(obj),
-                    f"{map_question_slugs_columns[question_slug]}_comment": obj["comment"],
-                }
-            )
-
-        case "budget-previsionnel":
-            try:
-                data.update({map_question_slugs_columns[question_slug]: float(obj["comment"])})
-            except ValueError:
-                pass
-
-        case (
-            "diagnostic-anct"
-            | "calendrier"
-            | "plan-de-financement-definitif"
-            | "plan-de-financement-previsionnel"
-        ):
-            data.update(
-                {
-                    map_question_slugs_columns[question_slug]: obj["comment"],
-                    f"{map_question_slugs_columns[question_slug]}_attachment": obj["attachment"],
-                }
-            )
-
-        case "partage-a-la-commune":
-            data.update(
-                {
-                    map_question_slugs_columns[question_slug]: obj["values"][0] == "Oui",
-                }
-            )
-
-        case (
-            "boussole"
-            | "description-de-laction"
-            | "indicateurs-de-suivi-et-deval"
-            | "maturite-du-projet"
-            | "partenaires-2"
-            | "procedures-administratives"
-            | "plan-de-financement-definitif"
-            | "maitre-douvrage-2"
-        ):
-            data.update({map_question_slugs_columns[question_slug]: obj["comment"]})
-
-        case _:
-            logger.info(f"Unhandled question: {obj['question']['text_short']}")
-
-    return {k: data[k] for k in available_keys if k in data}
+    return extractor(obj)
 
 
 def update_or_create_columns():
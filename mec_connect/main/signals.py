@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from celery import Task
+from celery.signals import task_postrun
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .clients import GristApiClient
+from .clients.throttling import pop_throttling_stats
+from .models import GristColumn, GristColumnFilter, GristConfig, GritColumnConfig
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=GristConfig)
+@receiver(post_delete, sender=GristConfig)
+def invalidate_grist_client(sender: type[GristConfig], instance: GristConfig, **kwargs: Any):
+    GristApiClient.invalidate(instance)
+
+
+@receiver(post_save, sender=GritColumnConfig)
+@receiver(post_delete, sender=GritColumnConfig)
+@receiver(post_save, sender=GristColumnFilter)
+@receiver(post_delete, sender=GristColumnFilter)
+def touch_grist_config(
+    sender: type[GritColumnConfig | GristColumnFilter],
+    instance: GritColumnConfig | GristColumnFilter,
+    **kwargs: Any,
+):
+    # bump the config version, so that its compiled snapshots are built again
+    GristConfig.objects.filter(id=instance.grist_config_id).update(modified=timezone.now())
+
+
+@receiver(post_save, sender=GristColumn)
+# before the deletion, while the column configs and filters still exist
+@receiver(pre_delete, sender=GristColumn)
+def touch_grist_configs_of_column(sender: type[GristColumn], instance: GristColumn, **kwargs: Any):
+    # the type and label of the column are compiled in the snapshots of the configs using it
+    GristConfig.objects.filter(
+        Q(column_configs__grist_column=instance) | Q(column_filters__grist_column=instance)
+    ).update(modified=timezone.now())
+
+
+@task_postrun.connect
+def log_throttling_stats(task: Task, **kwargs: Any):
+    # time spent by the task waiting for the rate limiters and the retries, by host
+    for host, stats in pop_throttling_stats().items():
+        logger.info(
+            f"Task {task.name} throttled by {host}: {stats['throttled_seconds']:.1f}s waited, "
+            f"{stats['retries']} retries"
+        )
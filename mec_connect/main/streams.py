@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+from typing import Any
+
+from django.conf import settings
+from redis import Redis, ResponseError
+
+_redis: Redis | None = None
+_redis_lock = threading.Lock()
+
+_group_ready = False
+
+
+def get_redis() -> Redis:
+    global _redis
+    with _redis_lock:
+        if _redis is None:
+            _redis = Redis.from_url(settings.WEBHOOK_STREAM_URL)
+    return _redis
+
+
+def consumer_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def append_webhook_event(remote_ip: str, headers: dict[str, str], data: dict[str, Any]) -> str:
+    """Append a verified webhook event to the ingestion stream, and return its entry ID."""
+
+    entry_id = get_redis().xadd(
+        settings.WEBHOOK_STREAM,
+        {
+            "remote_ip": remote_ip,
+            "headers": json.dumps(headers),
+            "data": json.dumps(data),
+        },
+        maxlen=settings.WEBHOOK_STREAM_MAXLEN,
+        approximate=True,
+    )
+    return entry_id.decode()
+
+
+def _ensure_group(redis: Redis) -> None:
+    global _group_ready
+    if _group_ready:
+        return
+    try:
+        redis.xgroup_create(
+            settings.WEBHOOK_STREAM, settings.WEBHOOK_STREAM_GROUP, id="0", mkstream=True
+        )
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+    _group_ready = True
+
+
+def _decode_entry(entry_id: bytes, fields: dict[bytes, bytes]) -> tuple[str, dict[str, Any]]:
+    return entry_id.decode(), {
+        "remote_ip": fields[b"remote_ip"].decode(),
+        "headers": json.loads(fields[b"headers"]),
+        "data": json.loads(fields[b"data"]),
+    }
+
+
+def read_webhook_events(count: int) -> list[tuple[str, dict[str, Any]]]:
+    """
+    Read a batch of entries from the ingestion stream, as a member of the consumer
+    group. Entries read by a consumer which has not acknowledged them for too long
+    are claimed first.
+    """
+
+    redis = get_redis()
+    _ensure_group(redis)
+
+    _, claimed, *_ = redis.xautoclaim(
+        settings.WEBHOOK_STREAM,
+        settings.WEBHOOK_STREAM_GROUP,
+        consumer_name(),
+        min_idle_time=settings.WEBHOOK_PROCESSING_TIMEOUT * 1000,
+        start_id="0-0",
+        count=count,
+    )
+    entries = [entry for entry in claimed if entry[1]]
+
+    if len(entries) < count:
+        for _, stream_entries in redis.xreadgroup(
+            settings.WEBHOOK_STREAM_GROUP,
+            consumer_name(),
+            {settings.WEBHOOK_STREAM: ">"},
+            count=count - len(entries),
+        ):
+            entries.extend(stream_entries)
+
+    return [_decode_entry(entry_id, fields) for entry_id, fields in entries]
+
+
+def ack_webhook_events(entry_ids: list[str]) -> None:
+    if not len(entry_ids):
+        return
+    redis = get_redis()
+    redis.xack(settings.WEBHOOK_STREAM, settings.WEBHOOK_STREAM_GROUP, *entry_ids)
+    redis.xdel(settings.WEBHOOK_STREAM, *entry_ids)
@@ -1,18 +1,43 @@
 from __future__ import annotations
 
-from typing import assert_never
+import asyncio
+import traceback
+from collections import defaultdict
+from collections.abc import Callable, Generator, Iterable
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import batched
+from typing import Any
+from uuid import UUID
 
-from celery import shared_task
+from celery import chord, shared_task
 from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
 
-from .choices import ObjectType, WebhookEventStatus
-from .clients import GristApiClient
-from .models import GristConfig, WebhookEvent
+from .choices import SyncJobKind, SyncJobStatus, WebhookEventStatus
+from .clients import GristApiClient, RecocoApiClient
+from .compiled import CompiledGristConfig, compile_config
+from .models import GristConfig, GristRecordState, SyncJob, WebhookEvent
 from .services import (
+    afetch_projects,
     check_column_filters,
     fetch_projects_data,
-    update_or_create_project_record,
+    fetch_projects_payloads,
+    filter_projects_data,
+    get_project_updated_on,
+    grist_table_exists,
+    is_updated_since,
+    map_project_data,
+    project_may_match,
+    requires_survey,
+    save_record_states,
+    update_or_create_project_records,
+    upsert_configs_project_records,
 )
+from .streams import ack_webhook_events, read_webhook_events
 
 logger = get_task_logger(__name__)
 
@@ -25,74 +50,524 @@ def process_webhook_event(event_id: int):
         logger.error(f"WebhookEvent with id={event_id} does not exist")
         return
 
-    match event.object_type:
-        case ObjectType.PROJECT | ObjectType.TAGGEDITEM:
-            project_id = int(event.object_id)
-        case ObjectType.SURVEY_ANSWER:
-            project_id = int(event.object_data.get("project"))
-        case _:
-            assert_never(event.object_type)
+    if event.status != WebhookEventStatus.PENDING:
+        # already processed along with another event of the same project
+        return
 
-    _update_project(project_id=project_id)
+    if event.project_id is None:
+        # saved before the project ID was resolved at creation
+        if (project_id := event.resolve_project_id()) is None:
+            logger.error(f"WebhookEvent with id={event_id} is not related to any project")
+            event.status = WebhookEventStatus.INVALID
+            event.save()
+            return
+        event.project_id = project_id
+        event.save(update_fields=["project_id"])
+    project_id = event.project_id
 
-    event.status = WebhookEventStatus.PROCESSED
-    event.save()
+    # all the pending events of the project are processed at once
+    events = _claim_events(WebhookEvent.objects.filter(Q(id=event.id) | Q(project_id=project_id)))
+    if not len(events):
+        # claimed by another worker in the meantime
+        return
 
+    _process_events(events)
 
-def _update_project(project_id: int) -> None:
-    for config in GristConfig.objects.filter(enabled=True):
-        for _, project_data in fetch_projects_data(config=config, project_ids=[project_id]):
-            if not check_column_filters(filters=config.filters, obj=project_data):
-                continue
-            update_or_create_project_record(
-                config=config, project_id=project_id, project_data=project_data
-            )
+
+@shared_task
+def process_webhook_events(event_ids: list[str] | None = None):
+    """
+    Claim a batch of pending events, and process them at once: each project is
+    fetched once, and the records of each Grist table are upserted in batches.
+    Events claimed by a worker are skipped by the other ones.
+
+    When `event_ids` are given, only these events are claimed, all at once.
+    """
+
+    events = WebhookEvent.objects.all()
+    if event_ids is not None:
+        events = events.filter(id__in=event_ids)
+
+    _resolve_project_ids(events.filter(project_id__isnull=True, status=WebhookEventStatus.PENDING))
+
+    events = _claim_events(
+        events.filter(project_id__isnull=False).order_by("created"),
+        limit=settings.WEBHOOK_BATCH_SIZE if event_ids is None else None,
+    )
+    if not len(events):
+        return
+
+    _process_events(events)
+    logger.info(f"{len(events)} webhook events processed")
 
 
 @shared_task
-def populate_grist_table(config_id: str):
+def consume_webhook_stream():
+    """
+    Materialize the webhook events buffered in the ingestion stream, then dispatch
+    their processing, once per project. The entries are acknowledged only once
+    their events are saved.
+    """
+
+    if not len(entries := read_webhook_events(count=settings.WEBHOOK_BATCH_SIZE)):
+        return
+
+    events = []
+    for _, entry in entries:
+        events.extend(
+            WebhookEvent.build_events(
+                remote_ip=entry["remote_ip"], headers=entry["headers"], payloads=[entry["data"]]
+            )
+        )
+
+    # the retries of an already delivered event are dropped
+    events = WebhookEvent.insert_new(events)
+    ack_webhook_events([entry_id for entry_id, _ in entries])
+
+    if settings.WEBHOOK_BATCH_PROCESSING:
+        return
+
+    dispatched = set()
+    for event in events:
+        if event.project_id in dispatched:
+            continue
+        dispatched.add(event.project_id)
+        process_webhook_event.apply_async((event.id,), countdown=settings.WEBHOOK_COALESCE_DELAY)
+
+
+def _resolve_project_ids(events: QuerySet[WebhookEvent]) -> None:
+    """
+    Save the project ID of the given events, when it was not resolved at their
+    creation, and mark the events which are not related to any project as invalid.
+    """
+
+    resolved = []
+    for event in events:
+        if (project_id := event.resolve_project_id()) is not None:
+            event.project_id = project_id
+            resolved.append(event)
+    WebhookEvent.objects.bulk_update(resolved, ["project_id"])
+
+    events.filter(project_id__isnull=True).update(
+        status=WebhookEventStatus.INVALID, modified=timezone.now()
+    )
+
+
+def _claim_events(events: QuerySet[WebhookEvent], limit: int | None = None) -> dict[int, int]:
+    """
+    Lock the pending events among the given ones, skipping those locked by other
+    workers, and mark them as being processed. Events left processing for too
+    long, by a worker which died, are claimed again.
+
+    Return the project IDs of the claimed events, by event ID.
+    """
+
+    stale = timezone.now() - timedelta(seconds=settings.WEBHOOK_PROCESSING_TIMEOUT)
+    with transaction.atomic():
+        claimed = dict(
+            events.filter(
+                Q(status=WebhookEventStatus.PENDING)
+                | Q(status=WebhookEventStatus.PROCESSING, modified__lt=stale),
+                project_id__isnull=False,
+            )
+            .select_for_update(skip_locked=True)
+            .values_list("id", "project_id")[:limit]
+        )
+        WebhookEvent.objects.filter(id__in=list(claimed)).update(
+            status=WebhookEventStatus.PROCESSING,
+            attempts=F("attempts") + 1,
+            modified=timezone.now(),
+        )
+    return claimed
+
+
+def _process_events(events: dict[int, int]) -> None:
+    try:
+        errors = _update_projects(project_ids=sorted(set(events.values())))
+    except Exception as exc:
+        _release_events(events, exception=str(exc), exception_traceback=traceback.format_exc())
+        raise
+
+    # only the events of the projects which failed are processed again
+    failed_events = defaultdict(dict)
+    for event_id, project_id in events.items():
+        if project_id in errors:
+            failed_events["\n".join(errors[project_id])][event_id] = project_id
+    for exception, project_events in failed_events.items():
+        _release_events(project_events, exception=exception)
+
+    WebhookEvent.objects.filter(
+        id__in=[event_id for event_id, project_id in events.items() if project_id not in errors]
+    ).update(
+        status=WebhookEventStatus.PROCESSED,
+        modified=timezone.now(),
+    )
+
+
+def _release_events(events: dict[int, int], exception: str, exception_traceback: str = "") -> None:
+    """
+    Put back the events which could not be processed, so that they are processed
+    again later on, unless they reached the max number of attempts.
+    """
+
+    events_qs = WebhookEvent.objects.filter(id__in=list(events))
+    events_qs.filter(attempts__lt=settings.WEBHOOK_MAX_ATTEMPTS).update(
+        status=WebhookEventStatus.PENDING,
+        exception=exception,
+        traceback=exception_traceback,
+        modified=timezone.now(),
+    )
+    events_qs.filter(attempts__gte=settings.WEBHOOK_MAX_ATTEMPTS).update(
+        status=WebhookEventStatus.FAILED,
+        exception=exception,
+        traceback=exception_traceback,
+        modified=timezone.now(),
+    )
+
+    if settings.WEBHOOK_BATCH_PROCESSING:
+        # claimed again by the periodic batch processing
+        return
+
+    retried = dict(
+        events_qs.filter(status=WebhookEventStatus.PENDING).values_list("project_id", "id")
+    )
+    for event_id in retried.values():
+        process_webhook_event.apply_async((event_id,), countdown=settings.WEBHOOK_RETRY_DELAY)
+
+
+def _update_projects(project_ids: list[int]) -> dict[int, list[str]]:
+    """
+    Update the records of the given projects in the table of each enabled config.
+    A project which can't be fetched, or a config which fails, does not prevent
+    the other ones from being written.
+
+    Return the errors of the projects which failed, by project ID.
+    """
+
+    configs = [compile_config(config) for config in GristConfig.objects.filter(enabled=True)]
+    if not len(configs):
+        return {}
+
+    # Recoco data is fetched once, then mapped for each config
+    fetch_errors = {}
+    projects_data = {config.id: {} for config in configs}
+    for project, answers in fetch_projects_payloads(
+        project_ids=project_ids,
+        keep_project=lambda p: any(project_may_match(config, p) for config in configs),
+        with_survey=any(requires_survey(config) for config in configs),
+        fetch_errors=fetch_errors,
+    ):
+        for config in configs:
+            project_data = map_project_data(config=config, project=project, answers=answers)
+            if check_column_filters(filters=config.filters, obj=project_data):
+                projects_data[config.id][project["id"]] = project_data
+
+    # and written in batches, the tables being written concurrently
+    configs = [config for config in configs if len(projects_data[config.id])]
+    exceptions = upsert_configs_project_records(
+        [(config, projects_data[config.id]) for config in configs]
+    )
+
+    errors = defaultdict(list)
+    for project_id, exc in fetch_errors.items():
+        logger.error(f"Error while fetching project #{project_id}: {exc}")
+        errors[project_id].append(f"Project #{project_id}: {exc}")
+    for config, exc in zip(configs, exceptions, strict=True):
+        if exc is not None:
+            logger.error(f"Error while updating projects {project_ids} in {config}: {exc}")
+            for project_id in projects_data[config.id]:
+                errors[project_id].append(f"{config}: {exc}")
+    return dict(errors)
+
+
+@contextmanager
+def _recording_failure(job: SyncJob) -> Generator[None]:
+    try:
+        yield
+    except Exception as exc:
+        job.finish(status=SyncJobStatus.FAILED, exception=str(exc))
+        raise
+
+
+def _resume_after(
+    list_projects: Callable[[], Iterable[dict[str, Any]]], cursor: int | None
+) -> Generator[dict[str, Any]]:
+    """
+    Stream the listed projects after the cursor, the ones up to it being skipped
+    without being kept in memory. When the cursor project is not listed anymore,
+    all the projects are listed again, and none is skipped.
+    """
+
+    if cursor is None:
+        yield from list_projects()
+        return
+
+    resumed = False
+    for project in list_projects():
+        if resumed:
+            yield project
+        elif project["id"] == cursor:
+            resumed = True
+
+    if not resumed:
+        yield from list_projects()
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def populate_grist_table(self, config_id: str):
+    """
+    Create the table of a config, then populate it by chunks of projects written
+    in parallel, the completion being recorded once all the chunks are done.
+
+    An interrupted populate job of the config is resumed: the table is kept as is
+    when it exists, and the projects which already have a record are skipped.
+    """
+
     try:
-        config = GristConfig.objects.get(id=config_id)
+        config = compile_config(GristConfig.objects.get(id=config_id))
     except GristConfig.DoesNotExist:
         logger.error(f"GristConfig with id={config_id} does not exist")
         return
 
+    job, resumed = SyncJob.resume_or_create(
+        grist_config_id=config.id, kind=SyncJobKind.POPULATE, task_id=self.request.id
+    )
+    if job is None:
+        logger.warning(f"GristConfig with id={config_id} is already being populated")
+        return
+
+    with _recording_failure(job):
+        if not resumed or not grist_table_exists(config):
+            # the projects updated from now on are synced incrementally once populated
+            GristConfig.objects.filter(id=config.id).update(synced_until=timezone.now())
+
+            GristApiClient.from_config(config).create_table(
+                table_id=config.table_id,
+                columns=config.table_columns_spec(),
+            )
+
+            # the records of the table are all written from scratch
+            GristRecordState.objects.filter(grist_config_id=config.id).delete()
+
+        # projects are listed once, those which surely don't match being dropped early,
+        # and only their IDs are kept and sent to the chunks
+        project_ids = (
+            project["id"]
+            for project in RecocoApiClient().iter_projects()
+            if project_may_match(config, project)
+        )
+        chunks = [
+            populate_grist_table_chunk.s(job_id=str(job.id), project_ids=list(chunk))
+            for chunk in batched(project_ids, settings.GRIST_POPULATE_CHUNK_SIZE)
+        ]
+
+    callback = populate_grist_table_done.s(job_id=str(job.id))
+    if not len(chunks):
+        callback.delay([])
+        return
+
+    chord(chunks)(callback)
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def populate_grist_table_chunk(job_id: str, project_ids: list[int]) -> dict[str, int]:
+    job = SyncJob.objects.select_related("grist_config").get(id=job_id)
+    config = compile_config(job.grist_config)
     grist_client = GristApiClient.from_config(config)
 
-    grist_client.create_table(
-        table_id=config.table_id,
-        columns=config.table_columns,
+    # records written before the job was interrupted are not created twice
+    existing_ids = set(
+        GristRecordState.objects.filter(
+            grist_config_id=config.id, object_id__in=project_ids
+        ).values_list("object_id", flat=True)
     )
+    project_ids = [project_id for project_id in project_ids if project_id not in existing_ids]
 
-    batch_records = []
-    batch_size = 100
+    batch_records = {}
+    batch_size = settings.GRIST_API_BATCH_SIZE
+    written = 0
 
-    for project_id, project_data in fetch_projects_data(config=config):
-        if not check_column_filters(filters=config.filters, obj=project_data):
-            continue
+    def _flush():
+        nonlocal written
+        grist_client.create_records(
+            table_id=config.table_id,
+            records=[{"object_id": k} | v for k, v in batch_records.items()],
+        )
+        save_record_states(config=config, records=batch_records)
+        job.add_progress(records=len(batch_records))
+        written += len(batch_records)
+        batch_records.clear()
+
+    with _recording_failure(job):
+        # the projects deleted since they were listed are skipped
+        fetch_errors = {}
+        projects = asyncio.run(afetch_projects(project_ids=project_ids, errors=fetch_errors))
+        for project_id, exc in fetch_errors.items():
+            logger.warning(f"Project #{project_id} skipped, it can't be fetched: {exc}")
 
-        batch_records.append({"object_id": project_id} | project_data)
+        for project_id, project_data in filter_projects_data(
+            filters=config.filters,
+            projects_data=fetch_projects_data(config=config, projects=projects),
+        ):
+            batch_records[project_id] = project_data
 
-        if len(batch_records) > batch_size - 1:
-            grist_client.create_records(table_id=config.table_id, records=batch_records)
-            batch_records = []
+            if len(batch_records) > batch_size - 1:
+                _flush()
 
-    if len(batch_records) > 0:
-        grist_client.create_records(table_id=config.table_id, records=batch_records)
+        if len(batch_records) > 0:
+            _flush()
+
+    job.add_progress(projects=len(project_ids))
+    return {"projects": len(project_ids), "records": written}
 
 
 @shared_task
-def refresh_grist_table(config_id: str):
+def populate_grist_table_done(results: list[dict[str, int]], job_id: str):
+    job = SyncJob.objects.get(id=job_id)
+    job.finish(status=SyncJobStatus.DONE)
+    logger.info(
+        f"GristConfig with id={job.grist_config_id} populated: "
+        f"{sum(r['records'] for r in results)} records written "
+        f"from {sum(r['projects'] for r in results)} projects, "
+        f"in {len(results)} chunks and {(timezone.now() - job.created).total_seconds():.1f}s"
+    )
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def refresh_grist_table(self, config_id: str, batch_size: int | None = None):
+    """
+    Update the records of all the projects in the table of a config.
+
+    An interrupted refresh job of the config is resumed after the last project
+    handled before it was interrupted.
+    """
+
     try:
-        config = GristConfig.objects.get(id=config_id)
+        config = compile_config(GristConfig.objects.get(id=config_id))
     except GristConfig.DoesNotExist:
         logger.error(f"GristConfig with id={config_id} does not exist")
         return
 
-    for project_id, project_data in fetch_projects_data(config=config):
-        if not check_column_filters(filters=config.filters, obj=project_data):
+    job, resumed = SyncJob.resume_or_create(
+        grist_config_id=config.id, kind=SyncJobKind.REFRESH, task_id=self.request.id
+    )
+    if job is None:
+        logger.warning(f"GristConfig with id={config_id} is already being refreshed")
+        return
+    if not resumed:
+        # the projects updated from now on are synced incrementally once refreshed
+        GristConfig.objects.filter(id=config.id).update(synced_until=timezone.now())
+    progress = {"projects": 0, "cursor": job.cursor}
+
+    def _track(projects_data):
+        for project_id, project_data in projects_data:
+            progress["projects"] += 1
+            progress["cursor"] = project_id
+            yield project_id, project_data
+
+    def _on_flush(written: int):
+        job.add_progress(projects=progress["projects"], records=written, cursor=progress["cursor"])
+        progress["projects"] = 0
+
+    with _recording_failure(job):
+        projects = _resume_after(RecocoApiClient().iter_projects, cursor=job.cursor)
+
+        update_or_create_project_records(
+            config=config,
+            projects_data=_track(
+                filter_projects_data(
+                    filters=config.filters,
+                    projects_data=fetch_projects_data(config=config, projects=projects),
+                )
+            ),
+            batch_size=batch_size,
+            on_flush=_on_flush,
+        )
+
+    job.add_progress(projects=progress["projects"], cursor=progress["cursor"])
+    job.finish(status=SyncJobStatus.DONE)
+
+
+@shared_task
+def sync_updated_projects():
+    """
+    Sync the projects updated in Recoco since the last incremental sync of each
+    enabled config, so that the records missed by the webhooks are recovered
+    without a full refresh.
+
+    Configs without a watermark, which have never been populated nor refreshed,
+    are skipped, as well as those being populated or refreshed: their records are
+    written by the running job, which could otherwise create them twice.
+    """
+
+    configs = [
+        compile_config(config)
+        for config in GristConfig.objects.filter(enabled=True, synced_until__isnull=False).exclude(
+            sync_jobs__status=SyncJobStatus.RUNNING
+        )
+    ]
+    if not len(configs):
+        return
+
+    watermarks = dict(
+        GristConfig.objects.filter(id__in=[config.id for config in configs]).values_list(
+            "id", "synced_until"
+        )
+    )
+
+    projects_data, latest = _fetch_updated_projects_data(configs=configs, watermarks=watermarks)
+
+    # only the projects updated since the watermarks, upserted without reading the whole tables
+    updated_configs = [config for config in configs if len(projects_data[config.id])]
+    exceptions = dict(
+        zip(
+            [config.id for config in updated_configs],
+            upsert_configs_project_records(
+                [(config, dict(projects_data[config.id])) for config in updated_configs]
+            ),
+            strict=True,
+        )
+    )
+
+    for config in configs:
+        if (exc := exceptions.get(config.id)) is not None:
+            # the watermark is left as is, the projects will be synced again next time
+            logger.error(f"Error while syncing updated projects of {config}: {exc}")
             continue
 
-        update_or_create_project_record(
-            config=config, project_id=project_id, project_data=project_data
+        if latest is not None:
+            GristConfig.objects.filter(id=config.id).filter(
+                Q(synced_until__isnull=True) | Q(synced_until__lt=latest)
+            ).update(synced_until=latest)
+
+
+def _fetch_updated_projects_data(
+    configs: list[CompiledGristConfig], watermarks: dict[UUID, datetime | None]
+) -> tuple[dict[UUID, list[tuple[int, dict[str, Any]]]], datetime | None]:
+    since = None if None in watermarks.values() else min(watermarks.values())
+    latest = since
+
+    def _keep_project(project):
+        nonlocal latest
+        if (updated_on := get_project_updated_on(project)) is not None:
+            latest = updated_on if latest is None else max(latest, updated_on)
+        return is_updated_since(project, since=since) and any(
+            is_updated_since(project, since=watermarks[config.id])
+            and project_may_match(config, project)
+            for config in configs
         )
+
+    # the project list is streamed once, the updated projects being mapped for each config
+    projects_data = {config.id: [] for config in configs}
+    for project, answers in fetch_projects_payloads(
+        keep_project=_keep_project,
+        with_survey=any(requires_survey(config) for config in configs),
+    ):
+        for config in configs:
+            if not is_updated_since(project, since=watermarks[config.id]):
+                continue
+            project_data = map_project_data(config=config, project=project, answers=answers)
+            if check_column_filters(filters=config.filters, obj=project_data):
+                projects_data[config.id].append((project["id"], project_data))
+
+    return projects_data, latest
@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from httpx import HTTPStatusError, MockTransport, Request, Response
+from main.clients import (
+    AsyncGristApiClient,
+    AsyncRecocoApiClient,
+    GristApiClient,
+    RecocoApiClient,
+)
+from main.clients.grist import BaseGristApiClient
+from main.clients.throttling import TokenBucket, _record, get_throttling_stats, retry_after
+from main.models import GristConfig
+from main.signals import log_throttling_stats
+
+from .factories import GristConfigFactory
+
+
+def _recoco_transport(routes: dict[str, object]) -> MockTransport:
+    def handler(request: Request) -> Response:
+        if request.url.path.endswith("/token/"):
+            return Response(200, json={"access": "access-token", "refresh": "refresh-token"})
+        return Response(200, json=routes[str(request.url)])
+
+    return MockTransport(handler)
+
+
+def test_iter_projects_follows_next_links():
+    transport = _recoco_transport(
+        {
+            "http://localhost:8000/projects/?page_size=2": {
+                "count": 3,
+                "next": "http://localhost:8000/projects/?page=2&page_size=2",
+                "results": [{"id": 1}, {"id": 2}],
+            },
+            "http://localhost:8000/projects/?page=2&page_size=2": {
+                "count": 3,
+                "next": None,
+                "results": [{"id": 3}],
+            },
+        }
+    )
+    client = RecocoApiClient(transport=transport)
+    assert [p["id"] for p in client.iter_projects(page_size=2)] == [1, 2, 3]
+
+
+def test_iter_projects_without_pagination():
+    transport = _recoco_transport(
+        {"http://localhost:8000/projects/?page_size=100": [{"id": 1}, {"id": 2}]}
+    )
+    client = RecocoApiClient(transport=transport)
+    assert [p["id"] for p in client.iter_projects()] == [1, 2]
+
+
+def test_async_recoco_client():
+    transport = _recoco_transport(
+        {
+            "http://localhost:8000/projects/?page_size=100": {
+                "next": None,
+                "results": [{"id": 1}, {"id": 2}],
+            },
+            "http://localhost:8000/survey/sessions/?project_id=1": {"count": 0, "results": []},
+        }
+    )
+
+    async def _run():
+        client = AsyncRecocoApiClient(transport=transport)
+        projects = [p async for p in client.iter_projects()]
+        sessions = await client.get_survey_sessions(project_id=1)
+        await client.aclose()
+        return projects, sessions
+
+    assert asyncio.run(_run()) == ([{"id": 1}, {"id": 2}], {"count": 0, "results": []})
+
+
+def test_async_grist_client():
+    def handler(request: Request) -> Response:
+        assert request.headers["Authorization"] == "Bearer api-key"
+        assert request.url.path == "/api/docs/doc-id/tables/"
+        return Response(200, json={"tables": [{"id": "Projects"}]})
+
+    async def _run():
+        client = AsyncGristApiClient(
+            api_key="api-key",
+            api_base_url="http://grist/api/",
+            doc_id="doc-id",
+            transport=MockTransport(handler),
+        )
+        exists = await client.table_exists(table_id="Projects")
+        await client.aclose()
+        return exists
+
+    assert asyncio.run(_run()) is True
+
+
+@pytest.mark.django_db
+def test_grist_client_registry():
+    config = GristConfigFactory()
+    client = GristApiClient.from_config(config)
+    assert GristApiClient.from_config(config) is client
+    assert GristApiClient.from_config(GristConfigFactory()) is not client
+
+    config.api_key = "new-api-key"
+    config.save()
+    new_client = GristApiClient.from_config(config)
+    assert new_client is not client
+    assert new_client.api_key == "new-api-key"
+
+
+@pytest.mark.django_db
+def test_grist_client_registry_throttling_changed():
+    config = GristConfigFactory()
+    client = GristApiClient.from_config(config)
+
+    # saved by another process, the registry of this one is not invalidated
+    GristConfig.objects.filter(id=config.id).update(api_rate_limit=2.0)
+    config = GristConfig.objects.get(id=config.id)
+    new_client = GristApiClient.from_config(config)
+    assert new_client is not client
+    assert new_client.rate_limit == 2.0
+    assert GristApiClient.from_config(config) is new_client
+
+
+@pytest.mark.django_db
+def test_async_grist_client_registry():
+    config = GristConfigFactory()
+
+    async def _run():
+        client = AsyncGristApiClient.from_config(config)
+        assert AsyncGristApiClient.from_config(config) is client
+        assert AsyncGristApiClient.from_config(GristConfigFactory.build()) is not client
+        await AsyncGristApiClient.aclose_all()
+        assert client._client.is_closed
+        return client
+
+    # the connections of a client are bound to the loop it was built in
+    assert asyncio.run(_run()) is not asyncio.run(_run())
+
+
+def test_base_grist_client_abstract():
+    with pytest.raises(TypeError):
+        BaseGristApiClient(api_key="api-key", api_base_url="http://grist/api/", doc_id="doc-id")
+
+
+@pytest.mark.django_db
+def test_grist_rate_limit_by_config():
+    shared_configs = GristConfigFactory.create_batch(2, api_base_url="http://grist-shared/api/")
+    own_config = GristConfigFactory(api_base_url="http://grist-shared/api/", api_rate_limit=1.0)
+
+    shared_buckets = [
+        GristApiClient.from_config(config).throttling_options["bucket"] for config in shared_configs
+    ]
+    own_bucket = GristApiClient.from_config(own_config).throttling_options["bucket"]
+
+    assert shared_buckets[0] is shared_buckets[1]
+    assert own_bucket is not shared_buckets[0]
+    assert own_bucket.rate == 1.0
+    assert shared_buckets[0].rate == settings.GRIST_API_RATE_LIMIT
+
+
+def test_grist_upsert_records():
+    payloads = []
+
+    def handler(request: Request) -> Response:
+        assert request.method == "PUT"
+        assert request.url.path == "/api/docs/doc-id/tables/Projects/records/"
+        payloads.append(json.loads(request.content))
+        return Response(200, json={})
+
+    client = GristApiClient(
+        api_key="api-key",
+        api_base_url="http://grist/api/",
+        doc_id="doc-id",
+        transport=MockTransport(handler),
+    )
+    client.upsert_records(
+        table_id="Projects",
+        records=[{"object_id": i, "name": f"project {i}"} for i in range(3)],
+        batch_size=2,
+    )
+
+    assert payloads == [
+        {
+            "records": [
+                {"require": {"object_id": 0}, "fields": {"name": "project 0"}},
+                {"require": {"object_id": 1}, "fields": {"name": "project 1"}},
+            ]
+        },
+        {"records": [{"require": {"object_id": 2}, "fields": {"name": "project 2"}}]},
+    ]
+
+
+def _jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+def test_recoco_tokens_shared_between_clients():
+    cache.clear()
+    calls = []
+
+    def handler(request: Request) -> Response:
+        calls.append(request.url.path)
+        if request.url.path == "/token/":
+            return Response(
+                200,
+                json={"access": _jwt(time.time() + 300), "refresh": _jwt(time.time() + 3600)},
+            )
+        return Response(200, json={"id": 1})
+
+    RecocoApiClient(transport=MockTransport(handler)).get_project(project_id=1)
+    RecocoApiClient(transport=MockTransport(handler)).get_project(project_id=1)
+
+    assert calls == ["/token/", "/projects/1/", "/projects/1/"]
+
+
+def test_recoco_token_refreshed_before_expiry():
+    cache.clear()
+    calls = []
+
+    def handler(request: Request) -> Response:
+        calls.append(request.url.path)
+        if request.url.path == "/token/":
+            # expires within the refresh margin
+            return Response(
+                200,
+                json={"access": _jwt(time.time() + 10), "refresh": _jwt(time.time() + 3600)},
+            )
+        if request.url.path == "/token/refresh/":
+            return Response(200, json={"access": _jwt(time.time() + 300)})
+        return Response(200, json={"id": 1})
+
+    client = RecocoApiClient(transport=MockTransport(handler))
+    client.get_project(project_id=1)
+    client.get_project(project_id=1)
+    client.get_project(project_id=1)
+
+    assert calls == [
+        "/token/",
+        "/projects/1/",
+        "/token/refresh/",
+        "/projects/1/",
+        "/projects/1/",
+    ]
+
+
+def test_recoco_token_refresh_rejected():
+    cache.clear()
+    calls = []
+
+    def handler(request: Request) -> Response:
+        calls.append(request.url.path)
+        if request.url.path == "/token/":
+            return Response(
+                200,
+                json={"access": _jwt(time.time() + 10), "refresh": _jwt(time.time() + 3600)},
+            )
+        if request.url.path == "/token/refresh/":
+            # blacklisted refresh token
+            return Response(401)
+        return Response(200, json={"id": 1})
+
+    client = RecocoApiClient(transport=MockTransport(handler))
+    client.get_project(project_id=1)
+    assert client.get_project(project_id=1) == {"id": 1}
+
+    assert calls == ["/token/", "/projects/1/", "/token/refresh/", "/token/", "/projects/1/"]
+
+
+def test_recoco_token_login_rejected():
+    cache.clear()
+
+    def handler(request: Request) -> Response:
+        return Response(401)
+
+    with pytest.raises(HTTPStatusError):
+        RecocoApiClient(transport=MockTransport(handler)).get_project(project_id=1)
+
+
+def test_recoco_rejected_token_renewed_once():
+    cache.clear()
+    calls = []
+
+    def handler(request: Request) -> Response:
+        calls.append(request.url.path)
+        if request.url.path == "/token/":
+            return Response(200, json={"access": f"access-{len(calls)}"})
+        if request.headers["Authorization"] == "Bearer access-1":
+            return Response(401)
+        return Response(200, json={"id": 1})
+
+    assert RecocoApiClient(transport=MockTransport(handler)).get_project(project_id=1) == {"id": 1}
+    assert calls == ["/token/", "/projects/1/", "/token/", "/projects/1/"]
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+
+    assert TokenBucket(rate=None, burst=1).reserve() == 0
+
+
+def test_retry_after():
+    assert retry_after(Response(429, headers={"Retry-After": "3"})) == 3
+    assert retry_after(Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0
+    assert retry_after(Response(429)) is None
+
+
+@override_settings(HTTP_BACKOFF_BASE=0.0)
+@pytest.mark.parametrize(
+    "method, status, attempts",
+    [
+        ("GET", 429, 2),
+        ("GET", 503, 2),
+        ("POST", 429, 2),
+        ("POST", 503, 1),
+        ("GET", 404, 1),
+    ],
+)
+def test_grist_retries(method, status, attempts):
+    calls = []
+
+    def handler(request: Request) -> Response:
+        calls.append(request)
+        if len(calls) == 1:
+            return Response(status, headers={"Retry-After": "0"})
+        return Response(200, json={"tables": [], "records": []})
+
+    client = GristApiClient(
+        api_key="api-key",
+        api_base_url="http://grist-retries/api/",
+        doc_id="doc-id",
+        max_retries=1,
+        transport=MockTransport(handler),
+    )
+    retries = get_throttling_stats().get("grist-retries", {}).get("retries", 0)
+
+    try:
+        if method == "GET":
+            client.get_tables()
+        else:
+            client.create_records(table_id="Projects", records=[{"name": "project"}])
+    except HTTPStatusError:
+        assert attempts == 1
+    else:
+        assert attempts == 2
+
+    assert len(calls) == attempts
+    assert get_throttling_stats().get("grist-retries", {}).get("retries", 0) == (
+        retries + attempts - 1
+    )
+
+
+def test_throttling_stats_logged_after_task():
+    _record("grist-logged", waited=1.5, retries=2)
+
+    task = Mock()
+    task.name = "main.tasks.refresh_grist_table"
+    with patch("main.signals.logger.info") as mock_info:
+        log_throttling_stats(task=task)
+
+    mock_info.assert_any_call(
+        "Task main.tasks.refresh_grist_table throttled by grist-logged: 1.5s waited, 2 retries"
+    )
+    assert "grist-logged" not in get_throttling_stats()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import pytest
+from main.choices import FilterOperator, GristColumnType
+from main.compiled import CompiledFilter, CompiledFilters, compile_config
+from main.models import GristColumn
+
+from .factories import GristColumnFactory, GristColumnFilterFactory, GristConfigFactory
+
+
+@pytest.mark.django_db
+def test_compile_config(default_columns):
+    config = GristConfigFactory(create_columns_config=True)
+
+    compiled = compile_config(config)
+    assert "name" in compiled.table_headers
+    assert compiled.column_types["object_id"] == GristColumnType.INTEGER
+    assert len(compiled.filters) == 0
+    assert compile_config(config) is compiled
+
+    GristColumnFilterFactory(
+        grist_config=config,
+        grist_column=GristColumnFactory(type=GristColumnType.TEXT),
+    )
+    config.refresh_from_db()
+
+    new_compiled = compile_config(config)
+    assert new_compiled is not compiled
+    assert len(new_compiled.filters) == 1
+
+
+@pytest.mark.django_db
+def test_compile_config_column_changed(default_columns):
+    config = GristConfigFactory(create_columns_config=True)
+    compiled = compile_config(config)
+
+    column = GristColumn.objects.get(col_id="name")
+    column.label = "Nom du projet"
+    column.save()
+    config.refresh_from_db()
+
+    new_compiled = compile_config(config)
+    assert new_compiled is not compiled
+    assert {"id": "name", "fields": {"label": "Nom du projet", "type": "Text"}} in (
+        new_compiled.table_columns_spec()
+    )
+
+
+@pytest.mark.parametrize(
+    "column_type, filter_value, filter_operator, value, expected_result",
+    [
+        (GristColumnType.INTEGER, "dummy value", FilterOperator.EQUAL, 1, False),
+        (GristColumnType.INTEGER, "1", FilterOperator.EQUAL, "dummy value", False),
+        (GristColumnType.INTEGER, "44", FilterOperator.EQUAL, 44, True),
+        (GristColumnType.TEXT, "value", FilterOperator.EQUAL, "VALUE", False),
+        (GristColumnType.TEXT, "value", FilterOperator.I_EQUAL, "VALUE", True),
+        (GristColumnType.TEXT, "value", FilterOperator.I_NOT_EQUAL, "VALUE", False),
+        (GristColumnType.TEXT, "deux", FilterOperator.CONTAINS, "un,deux,trois", True),
+        (GristColumnType.TEXT, "deux", FilterOperator.I_CONTAINS, "UN,DEUX,TROIS", True),
+        (GristColumnType.BOOL, "true", FilterOperator.EQUAL, True, True),
+    ],
+)
+def test_compiled_filter(column_type, filter_value, filter_operator, value, expected_result):
+    compiled_filter = CompiledFilter.from_filter(
+        GristColumnFilterFactory.build(
+            grist_column__col_id="column",
+            grist_column__type=column_type,
+            filter_value=filter_value,
+            filter_operator=filter_operator,
+        )
+    )
+    assert compiled_filter.check_object({"column": value}) is expected_result
+    assert compiled_filter.check_object({"other_column": value}) is False
+
+
+def test_compiled_filters_groups():
+    def _filter(col_id, filter_value, group):
+        return GristColumnFilterFactory.build(
+            grist_column__col_id=col_id,
+            grist_column__type=GristColumnType.INTEGER,
+            filter_value=filter_value,
+            filter_group=group,
+        )
+
+    # (department_code = 44 AND insee = 1) OR department_code = 85
+    filters = CompiledFilters.from_filters(
+        [
+            _filter("department_code", "44", 0),
+            _filter("insee", "1", 0),
+            _filter("department_code", "85", 1),
+        ]
+    )
+    objs = [
+        {"department_code": 44, "insee": 1},
+        {"department_code": 44, "insee": 2},
+        {"department_code": 85, "insee": 2},
+        {"insee": 1},
+    ]
+
+    assert [filters.check_object(obj) for obj in objs] == [True, False, True, False]
+    assert filters.check_objects(objs) == [True, False, True, False]
+    assert CompiledFilters().check_objects(objs) == [True] * 4
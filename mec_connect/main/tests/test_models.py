@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+from datetime import UTC, datetime
+from unittest.mock import patch
+
 import pytest
-from main.choices import FilterOperator, GristColumnType
-from main.models import GristColumnFilter
+from django.test import override_settings
+from main.choices import FilterOperator, GristColumnType, SyncJobKind
+from main.models import GristColumnFilter, SyncJob, WebhookEvent
 from unittest_parametrize import ParametrizedTestCase, param, parametrize
 
 from .factories import GristColumnFactory, GristColumnFilterFactory, GristConfigFactory
@@ -125,3 +129,36 @@ class GristColumnFilterTests(ParametrizedTestCase):
             filter_operator=filter_operator,
         )
         assert filter.check_value(value) == expected_result
+
+
+@pytest.mark.django_db
+def test_sync_job_resumed_by_its_task():
+    config = GristConfigFactory()
+    job, resumed = SyncJob.resume_or_create(
+        grist_config_id=config.id, kind=SyncJobKind.REFRESH, task_id="task"
+    )
+    assert resumed is False
+
+    # delivered again after its worker died
+    assert SyncJob.resume_or_create(
+        grist_config_id=config.id, kind=SyncJobKind.REFRESH, task_id="task"
+    ) == (job, True)
+    # while another task does not run it
+    assert SyncJob.resume_or_create(
+        grist_config_id=config.id, kind=SyncJobKind.REFRESH, task_id="other-task"
+    ) == (None, False)
+
+
+@override_settings(WEBHOOK_DEDUP_WINDOW=60 * 60)
+def test_webhook_event_dedup_window():
+    def _window(hour, minute):
+        with patch(
+            "main.models.timezone.now", return_value=datetime(2024, 6, 1, hour, minute, tzinfo=UTC)
+        ):
+            return WebhookEvent.current_dedup_window()
+
+    assert _window(10, 0) == _window(10, 59)
+    assert _window(10, 59) != _window(11, 0)
+
+    with override_settings(WEBHOOK_DEDUP_WINDOW=0):
+        assert WebhookEvent.current_dedup_window() is None
@@ -1,17 +1,36 @@
 from __future__ import annotations
 
-from unittest.mock import Mock, patch
+import asyncio
+from unittest.mock import AsyncMock, Mock, call, patch
 
 import pytest
-from main.models import GristColumn, GritColumnConfig
+from django.test import override_settings
+from django.utils.dateparse import parse_datetime
+from httpx import HTTPStatusError
+from main.compiled import compile_config
+from main.models import (
+    GristColumn,
+    GristColumnFilter,
+    GristRecordState,
+    GritColumnConfig,
+    RecocoProject,
+)
 from main.services import (
     check_table_columns_consistency,
+    fetch_projects_payloads,
     grist_table_exists,
     map_from_project_payload_object,
     map_from_survey_answer_payload_object,
+    project_may_match,
+    requires_survey,
+    save_record_states,
+    update_or_create_project_record,
+    update_or_create_project_records,
+    upsert_configs_project_records,
+    upsert_project_records,
 )
 
-from .factories import GristConfigFactory
+from .factories import GristColumnFilterFactory, GristConfigFactory
 from .fixtures import table_columns
 
 
@@ -19,7 +38,7 @@ from .fixtures import table_columns
 def test_map_from_project_payload_object(project_payload_object, default_columns):
     assert map_from_project_payload_object(
         obj=project_payload_object,
-        config=GristConfigFactory(create_columns_config=True),
+        config=compile_config(GristConfigFactory(create_columns_config=True)),
     ) == {
         "name": "Pôle Santé",
         "context": "Le projet consiste à créer un pôle santé",
@@ -37,7 +56,7 @@ def test_map_from_project_payload_object(project_payload_object, default_columns
 def test_map_from_survey_answer_payload_object(survey_answer_payload_object, default_columns):
     assert map_from_survey_answer_payload_object(
         obj=survey_answer_payload_object,
-        config=GristConfigFactory(create_columns_config=True),
+        config=compile_config(GristConfigFactory(create_columns_config=True)),
     ) == {
         "topics": "Commerce rural,Citoyenneté / Participation de la population à la vie locale,"
         "Transition écologique et biodiversité,"
@@ -46,8 +65,32 @@ def test_map_from_survey_answer_payload_object(survey_answer_payload_object, def
     }
 
 
+@pytest.mark.django_db
+def test_map_from_survey_answer_payload_object_config_spec(
+    survey_answer_payload_object, default_columns
+):
+    config = GristConfigFactory(
+        create_columns_config=True,
+        survey_answers_spec={"thematiques-2": {"column": "action", "strategy": "comment"}},
+    )
+    assert map_from_survey_answer_payload_object(
+        obj=survey_answer_payload_object,
+        config=compile_config(config),
+    ) == {"action": "Mon commentaire sur les thématiques"}
+
+    survey_answer_payload_object["question"]["slug"] = "unknown"
+    assert (
+        map_from_survey_answer_payload_object(
+            obj=survey_answer_payload_object,
+            config=compile_config(config),
+        )
+        == {}
+    )
+
+
+@pytest.mark.django_db
 def test_grist_table_exists():
-    config = GristConfigFactory.build()
+    config = compile_config(GristConfigFactory())
     with patch("main.services.GristApiClient.table_exists", return_value=True) as mock_table_exists:
         assert grist_table_exists(config) is True
         mock_table_exists.assert_called_once_with(table_id=config.table_id)
@@ -57,10 +100,317 @@ def test_grist_table_exists():
 @patch("main.services.GristApiClient.get_table_columns", Mock(return_value=table_columns))
 def test_check_table_columns_consistency(default_columns):
     config = GristConfigFactory(create_columns_config=True)
-    assert check_table_columns_consistency(config) is True
+    assert check_table_columns_consistency(compile_config(config)) is True
 
     GritColumnConfig.objects.create(
         grist_column=GristColumn.objects.first(),
         grist_config=config,
     )
-    assert check_table_columns_consistency(config) is False
+    config.refresh_from_db()
+    assert check_table_columns_consistency(compile_config(config)) is False
+
+
+@patch(
+    "main.services.RecocoApiClient.iter_projects",
+    Mock(return_value=iter([{"id": i} for i in range(10)])),
+)
+@patch(
+    "main.services.RecocoApiClient.get_survey_sessions",
+    Mock(side_effect=lambda project_id: {"count": 1, "results": [{"id": project_id * 10}]}),
+)
+@patch(
+    "main.services.RecocoApiClient.get_survey_session_answers",
+    Mock(side_effect=lambda session_id: {"results": [{"session": session_id}]}),
+)
+@pytest.mark.django_db
+def test_fetch_projects_payloads():
+    assert list(fetch_projects_payloads()) == [
+        ({"id": i}, [{"session": i * 10}]) for i in range(10)
+    ]
+    assert RecocoProject.objects.count() == 10
+
+
+@patch(
+    "main.services.RecocoApiClient.iter_projects",
+    Mock(
+        return_value=iter(
+            [
+                {"id": 1, "updated_on": "2024-06-01T10:00:00+02:00"},
+                {"id": 2, "updated_on": "2024-06-02T10:00:00+02:00"},
+            ]
+        )
+    ),
+)
+@patch(
+    "main.services.RecocoApiClient.get_survey_sessions",
+    Mock(side_effect=lambda project_id: {"count": 1, "results": [{"id": project_id * 10}]}),
+)
+@patch(
+    "main.services.RecocoApiClient.get_survey_session_answers",
+    Mock(side_effect=lambda session_id: {"results": [{"session": session_id}]}),
+)
+@pytest.mark.django_db
+def test_fetch_projects_payloads_mirror():
+    RecocoProject.objects.create(
+        project_id=1,
+        survey_answers=[{"session": "mirrored"}],
+        updated_on=parse_datetime("2024-06-01T10:00:00+02:00"),
+    )
+    RecocoProject.objects.create(
+        project_id=2,
+        survey_answers=[{"session": "mirrored"}],
+        updated_on=parse_datetime("2024-06-01T10:00:00+02:00"),
+    )
+
+    assert [answers for _, answers in fetch_projects_payloads()] == [
+        [{"session": "mirrored"}],
+        [{"session": 20}],
+    ]
+    assert RecocoProject.objects.get(project_id=2).survey_answers == [{"session": 20}]
+
+
+@patch(
+    "main.services.GristApiClient.get_records",
+    Mock(return_value={"records": [{"id": 1, "fields": {"object_id": 10}}]}),
+)
+@patch("main.services.GristApiClient.create_records")
+@patch("main.services.GristApiClient.update_records")
+@pytest.mark.django_db
+def test_update_or_create_project_records(mock_update_records, mock_create_records):
+    config = compile_config(GristConfigFactory())
+    update_or_create_project_records(
+        config=config,
+        projects_data=[(10, {"name": "a"}), (11, {"name": "b"}), (12, {"name": "c"})],
+        batch_size=2,
+    )
+
+    mock_update_records.assert_called_once_with(
+        table_id=config.table_id, records={1: {"name": "a"}}
+    )
+    assert mock_create_records.call_args_list == [
+        call(table_id=config.table_id, records=[{"object_id": 11, "name": "b"}]),
+        call(table_id=config.table_id, records=[{"object_id": 12, "name": "c"}]),
+    ]
+
+
+@pytest.mark.django_db
+@patch(
+    "main.services.GristApiClient.get_records",
+    Mock(return_value={"records": [{"id": 1, "fields": {"object_id": 1}}]}),
+)
+@patch("main.services.GristApiClient.upsert_records")
+def test_upsert_project_records(mock_upsert_records):
+    config = compile_config(GristConfigFactory())
+    save_record_states(config=config, records={1: {"name": "a", "city": "a"}})
+
+    upsert_project_records(
+        config=config,
+        projects_data={
+            1: {"name": "a", "city": "b"},
+            2: {"name": "c", "city": "c"},
+            3: {"name": "d", "city": "d"},
+        },
+    )
+
+    assert mock_upsert_records.call_count == 2
+    mock_upsert_records.assert_any_call(
+        table_id=config.table_id, records=[{"object_id": 1, "city": "b"}]
+    )
+    mock_upsert_records.assert_any_call(
+        table_id=config.table_id,
+        records=[
+            {"object_id": 2, "name": "c", "city": "c"},
+            {"object_id": 3, "name": "d", "city": "d"},
+        ],
+    )
+    assert GristRecordState.objects.filter(grist_config_id=config.id).count() == 3
+
+
+@pytest.mark.django_db
+@patch(
+    "main.services.GristApiClient.get_records",
+    Mock(return_value={"records": [{"id": 1, "fields": {"object_id": 10}}]}),
+)
+@patch("main.services.GristApiClient.upsert_records")
+def test_update_or_create_project_record_changes(mock_upsert_records):
+    config = compile_config(GristConfigFactory())
+
+    update_or_create_project_record(
+        config=config, project_id=10, project_data={"name": "a", "city": "b"}
+    )
+    mock_upsert_records.assert_called_once_with(
+        table_id=config.table_id,
+        records=[{"object_id": 10, "name": "a", "city": "b"}],
+    )
+
+    mock_upsert_records.reset_mock()
+    update_or_create_project_record(
+        config=config, project_id=10, project_data={"name": "a", "city": "b"}
+    )
+    mock_upsert_records.assert_not_called()
+
+    update_or_create_project_record(
+        config=config, project_id=10, project_data={"name": "a", "city": "c"}
+    )
+    mock_upsert_records.assert_called_once_with(
+        table_id=config.table_id,
+        records=[{"object_id": 10, "city": "c"}],
+    )
+
+
+@pytest.mark.django_db
+@patch("main.services.GristApiClient.get_records", Mock(return_value={"records": []}))
+@patch("main.services.GristApiClient.upsert_records")
+def test_upsert_project_records_row_deleted(mock_upsert_records):
+    config = compile_config(GristConfigFactory())
+    save_record_states(config=config, records={1: {"name": "a", "city": "a"}})
+
+    # the row has been deleted from the table in the meantime
+    upsert_project_records(config=config, projects_data={1: {"name": "a", "city": "b"}})
+
+    mock_upsert_records.assert_called_once_with(
+        table_id=config.table_id, records=[{"object_id": 1, "name": "a", "city": "b"}]
+    )
+
+
+@pytest.mark.django_db
+@patch("main.services.GristApiClient.get_records", Mock(return_value={"records": []}))
+@patch("main.services.GristApiClient.upsert_records")
+def test_upsert_configs_project_records(mock_upsert_records):
+    def upsert_records(table_id, records):
+        if table_id == "failing":
+            raise HTTPStatusError("boom", request=Mock(), response=Mock())
+
+    mock_upsert_records.side_effect = upsert_records
+
+    config = compile_config(GristConfigFactory(table_id="written"))
+    failing_config = compile_config(GristConfigFactory(table_id="failing"))
+    unchanged_config = compile_config(GristConfigFactory())
+    save_record_states(config=unchanged_config, records={1: {"name": "a"}})
+
+    errors = upsert_configs_project_records(
+        [
+            (config, {1: {"name": "a"}}),
+            (failing_config, {1: {"name": "a"}}),
+            (unchanged_config, {1: {"name": "a"}}),
+        ]
+    )
+
+    assert errors[0] is None
+    assert isinstance(errors[1], HTTPStatusError)
+    assert errors[2] is None
+    assert mock_upsert_records.call_count == 2
+    mock_upsert_records.assert_any_call(table_id="written", records=[{"object_id": 1, "name": "a"}])
+    assert GristRecordState.objects.filter(grist_config_id=config.id).exists()
+    assert not GristRecordState.objects.filter(grist_config_id=failing_config.id).exists()
+
+
+@pytest.mark.django_db
+@patch(
+    "main.services.GristApiClient.get_records",
+    Mock(
+        return_value={
+            "records": [
+                {"id": 1, "fields": {"object_id": 10}},
+                {"id": 2, "fields": {"object_id": 11}},
+                {"id": 3, "fields": {"object_id": 12}},
+            ]
+        }
+    ),
+)
+@patch("main.services.GristApiClient.create_records", Mock())
+@patch("main.services.GristApiClient.update_records")
+def test_update_or_create_project_records_changes(mock_update_records):
+    config = compile_config(GristConfigFactory())
+    save_record_states(
+        config=config,
+        records={10: {"name": "a", "city": "a"}, 11: {"name": "b", "city": "b"}},
+    )
+
+    update_or_create_project_records(
+        config=config,
+        projects_data=[
+            (10, {"name": "a", "city": "a"}),
+            (11, {"name": "b", "city": "x"}),
+            (12, {"name": "c", "city": "c"}),
+        ],
+    )
+
+    assert mock_update_records.call_count == 2
+    mock_update_records.assert_any_call(table_id=config.table_id, records={2: {"city": "x"}})
+    mock_update_records.assert_any_call(
+        table_id=config.table_id, records={3: {"name": "c", "city": "c"}}
+    )
+    assert GristRecordState.objects.filter(grist_config_id=config.id).count() == 3
+
+
+@patch(
+    "main.services.RecocoApiClient.iter_projects", Mock(return_value=iter([{"id": 1}, {"id": 2}]))
+)
+@patch("main.services.RecocoApiClient.get_survey_sessions")
+def test_fetch_projects_payloads_pushdown(mock_get_survey_sessions):
+    assert list(
+        fetch_projects_payloads(keep_project=lambda p: p["id"] == 2, with_survey=False)
+    ) == [({"id": 2}, [])]
+    mock_get_survey_sessions.assert_not_called()
+
+
+@patch(
+    "main.services.AsyncRecocoApiClient.get_project",
+    AsyncMock(side_effect=lambda project_id: {"id": project_id}),
+)
+def test_fetch_projects_payloads_by_id():
+    assert list(fetch_projects_payloads(project_ids=[2, 1], with_survey=False)) == [
+        ({"id": 2}, []),
+        ({"id": 1}, []),
+    ]
+
+
+def test_fetch_projects_payloads_by_id_errors():
+    in_flight = max_in_flight = 0
+
+    async def get_project(project_id):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+        if project_id == 2:
+            raise HTTPStatusError("not found", request=Mock(), response=Mock())
+        return {"id": project_id}
+
+    fetch_errors = {}
+    with (
+        override_settings(RECOCO_API_CONCURRENCY=2),
+        patch("main.services.AsyncRecocoApiClient.get_project", side_effect=get_project),
+    ):
+        payloads = list(
+            fetch_projects_payloads(
+                project_ids=[1, 2, 3, 4], with_survey=False, fetch_errors=fetch_errors
+            )
+        )
+
+    assert payloads == [({"id": 1}, []), ({"id": 3}, []), ({"id": 4}, [])]
+    assert list(fetch_errors) == [2]
+    assert max_in_flight == 2
+
+
+@pytest.mark.django_db
+def test_project_may_match(project_payload_object, default_columns):
+    config = GristConfigFactory(create_columns_config=True)
+    assert requires_survey(compile_config(config)) is True
+
+    for col_id, filter_value in (("department_code", "44"), ("topics", "Logement")):
+        GristColumnFilterFactory(
+            grist_config=config,
+            grist_column=GristColumn.objects.get(col_id=col_id),
+            filter_value=filter_value,
+        )
+    config.refresh_from_db()
+    assert project_may_match(compile_config(config), project_payload_object) is True
+
+    GristColumnFilter.objects.filter(grist_column__col_id="department_code").update(
+        filter_value="85"
+    )
+    config.save()
+    assert project_may_match(compile_config(config), project_payload_object) is False
@@ -1,16 +1,46 @@
 from __future__ import annotations
 
+from datetime import timedelta
+from typing import Any
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
-from main.choices import ObjectType, WebhookEventStatus
-from main.tasks import populate_grist_table, process_webhook_event, refresh_grist_table
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from httpx import HTTPStatusError
+from main.choices import ObjectType, SyncJobKind, SyncJobStatus, WebhookEventStatus
+from main.models import GristConfig, GristRecordState, SyncJob, WebhookEvent
+from main.tasks import (
+    _update_projects,
+    consume_webhook_stream,
+    populate_grist_table,
+    populate_grist_table_chunk,
+    process_webhook_event,
+    process_webhook_events,
+    refresh_grist_table,
+    sync_updated_projects,
+)
 from unittest_parametrize import ParametrizedTestCase, param, parametrize
 
 from .factories import GristConfigFactory, WebhookEventFactory
 
 
+async def _get_project(project_id: int) -> dict[str, Any]:
+    if project_id == 404:
+        raise HTTPStatusError("not found", request=Mock(), response=Mock())
+    return {"id": project_id}
+
+
+def _stale_job(**kwargs) -> SyncJob:
+    """A running job left without progress by a worker which died."""
+
+    job = SyncJob.objects.create(**kwargs)
+    SyncJob.objects.filter(id=job.id).update(modified=timezone.now() - timedelta(days=1))
+    return job
+
+
 class ProcessWebhookEventTests(ParametrizedTestCase):
     @parametrize(
         "object_type, object_id, object_payload",
@@ -28,12 +58,89 @@ class ProcessWebhookEventTests(ParametrizedTestCase):
             payload={"object": object_payload},
         )
 
-        with patch("main.tasks._update_project") as mock_update_project:
+        with patch("main.tasks._update_projects") as mock_update_projects:
+            process_webhook_event(event_id=event.id)
+
+        mock_update_projects.assert_called_once_with(project_ids=[999])
+
+        event.refresh_from_db()
+        assert event.status == WebhookEventStatus.PROCESSED
+
+    @pytest.mark.django_db
+    def test_events_of_same_project_coalesced(self):
+        events = [
+            WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=999),
+            WebhookEventFactory(object_type=ObjectType.TAGGEDITEM, object_id=999),
+            WebhookEventFactory(
+                object_type=ObjectType.SURVEY_ANSWER,
+                object_id=888,
+                payload={"object": {"project": 999}},
+            ),
+        ]
+        other_event = WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=111)
+
+        with patch("main.tasks._update_projects") as mock_update_projects:
+            for event in events:
+                process_webhook_event(event_id=event.id)
+
+        mock_update_projects.assert_called_once_with(project_ids=[999])
+
+        for event in events:
+            event.refresh_from_db()
+            assert event.status == WebhookEventStatus.PROCESSED
+
+        other_event.refresh_from_db()
+        assert other_event.status == WebhookEventStatus.PENDING
+
+    @pytest.mark.django_db
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=2)
+    @patch("main.tasks.process_webhook_event.apply_async")
+    def test_failure_recorded(self, mock_apply_async):
+        event = WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=999)
+
+        with patch("main.tasks._update_projects", side_effect=ValueError("boom")):
+            with pytest.raises(ValueError):
+                process_webhook_event(event_id=event.id)
+
+            # put back, to be processed again later on
+            event.refresh_from_db()
+            assert event.status == WebhookEventStatus.PENDING
+            assert event.exception == "boom"
+            mock_apply_async.assert_called_once_with((event.id,), countdown=60)
+
+            mock_apply_async.reset_mock()
+            with pytest.raises(ValueError):
+                process_webhook_event(event_id=event.id)
+
+        event.refresh_from_db()
+        assert event.status == WebhookEventStatus.FAILED
+        assert event.attempts == 2
+        mock_apply_async.assert_not_called()
+
+    @pytest.mark.django_db
+    @patch("main.tasks.process_webhook_event.apply_async", Mock())
+    def test_config_errors_recorded(self):
+        event = WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=999)
+
+        with patch("main.tasks._update_projects", return_value={999: ["config: boom"]}):
             process_webhook_event(event_id=event.id)
 
-        mock_update_project.assert_called_once_with(project_id=999)
+        event.refresh_from_db()
+        assert event.status == WebhookEventStatus.PENDING
+        assert event.exception == "config: boom"
+
+    @pytest.mark.django_db
+    def test_project_id_resolved(self):
+        # saved before the project ID was resolved at creation
+        event = WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=999)
+        WebhookEvent.objects.filter(id=event.id).update(project_id=None)
+
+        with patch("main.tasks._update_projects") as mock_update_projects:
+            process_webhook_event(event_id=event.id)
 
+        mock_update_projects.assert_called_once_with(project_ids=[999])
         event.refresh_from_db()
+        assert event.project_id == 999
         assert event.status == WebhookEventStatus.PROCESSED
 
     @pytest.mark.django_db
@@ -43,6 +150,134 @@ class ProcessWebhookEventTests(ParametrizedTestCase):
         logger_mock.assert_called_once_with("WebhookEvent with id=1 does not exist")
 
 
+class ProcessWebhookEventsTests(TestCase):
+    @pytest.mark.django_db
+    @patch("main.tasks._update_projects")
+    def test_batch_claimed(self, mock_update_projects):
+        events = [
+            WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=999),
+            WebhookEventFactory(object_type=ObjectType.TAGGEDITEM, object_id=999),
+            WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=111),
+        ]
+        processed_event = WebhookEventFactory(
+            object_type=ObjectType.PROJECT, object_id=222, status=WebhookEventStatus.PROCESSED
+        )
+        invalid_event = WebhookEventFactory(object_type="unknown")
+        # saved before the project ID was resolved at creation
+        events.append(WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=333))
+        WebhookEvent.objects.filter(id=events[-1].id).update(project_id=None)
+
+        process_webhook_events()
+
+        mock_update_projects.assert_called_once_with(project_ids=[111, 333, 999])
+        for event in events:
+            event.refresh_from_db()
+            assert event.status == WebhookEventStatus.PROCESSED
+        invalid_event.refresh_from_db()
+        assert invalid_event.status == WebhookEventStatus.INVALID
+
+        mock_update_projects.reset_mock()
+        process_webhook_events()
+        mock_update_projects.assert_not_called()
+        processed_event.refresh_from_db()
+        assert processed_event.status == WebhookEventStatus.PROCESSED
+
+    @pytest.mark.django_db
+    @patch("main.tasks._update_projects")
+    def test_given_events_claimed(self, mock_update_projects):
+        event = WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=999)
+        other_event = WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=111)
+
+        process_webhook_events(event_ids=[str(event.id)])
+
+        mock_update_projects.assert_called_once_with(project_ids=[999])
+        other_event.refresh_from_db()
+        assert other_event.status == WebhookEventStatus.PENDING
+
+    @pytest.mark.django_db
+    @override_settings(WEBHOOK_BATCH_PROCESSING=True)
+    @patch("main.tasks._update_projects", Mock(return_value={111: ["Project #111: boom"]}))
+    def test_project_failure_isolated(self):
+        event = WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=999)
+        failed_event = WebhookEventFactory(object_type=ObjectType.PROJECT, object_id=111)
+
+        process_webhook_events()
+
+        event.refresh_from_db()
+        assert event.status == WebhookEventStatus.PROCESSED
+        failed_event.refresh_from_db()
+        assert failed_event.status == WebhookEventStatus.PENDING
+        assert failed_event.exception == "Project #111: boom"
+
+
+class UpdateProjectsTests(TestCase):
+    @pytest.mark.django_db
+    @patch("main.tasks.upsert_configs_project_records")
+    @patch("main.tasks.map_project_data")
+    @patch("main.tasks.fetch_projects_payloads")
+    def test_fetch_once_for_all_configs(
+        self,
+        mock_fetch_projects_payloads,
+        mock_map_project_data,
+        mock_upsert_configs_project_records,
+    ):
+        mock_fetch_projects_payloads.return_value = [({"id": 999}, []), ({"id": 111}, [])]
+        mock_map_project_data.return_value = {"name": "project"}
+        mock_upsert_configs_project_records.return_value = [None, None, None]
+
+        GristConfigFactory.create_batch(3)
+        GristConfigFactory(enabled=False)
+
+        assert _update_projects(project_ids=[111, 999]) == {}
+
+        mock_fetch_projects_payloads.assert_called_once()
+        assert mock_fetch_projects_payloads.call_args.kwargs["project_ids"] == [111, 999]
+        assert mock_map_project_data.call_count == 6
+        mock_upsert_configs_project_records.assert_called_once()
+        configs_projects_data = mock_upsert_configs_project_records.call_args.args[0]
+        assert len(configs_projects_data) == 3
+        assert configs_projects_data[0][1] == {
+            999: {"name": "project"},
+            111: {"name": "project"},
+        }
+
+    @pytest.mark.django_db
+    @patch("main.tasks.upsert_configs_project_records")
+    @patch("main.tasks.map_project_data", Mock(return_value={"name": "project"}))
+    @patch("main.tasks.fetch_projects_payloads", Mock(return_value=[({"id": 999}, [])]))
+    def test_config_failure_isolated(self, mock_upsert_configs_project_records):
+        failing_config, _ = GristConfigFactory.create_batch(2)
+
+        def upsert_configs_project_records(configs_projects_data):
+            return [
+                HTTPStatusError("boom", request=Mock(), response=Mock())
+                if config.id == failing_config.id
+                else None
+                for config, _ in configs_projects_data
+            ]
+
+        mock_upsert_configs_project_records.side_effect = upsert_configs_project_records
+
+        errors = _update_projects(project_ids=[999])
+
+        assert errors == {999: [f"{failing_config}: boom"]}
+
+    @pytest.mark.django_db
+    @patch("main.tasks.upsert_configs_project_records", Mock(return_value=[None]))
+    @patch("main.tasks.map_project_data", Mock(return_value={"name": "project"}))
+    @patch("main.tasks.fetch_projects_payloads")
+    def test_project_fetch_failure_isolated(self, mock_fetch_projects_payloads):
+        GristConfigFactory()
+
+        def fetch_projects_payloads(fetch_errors, **kwargs):
+            fetch_errors[111] = HTTPStatusError("boom", request=Mock(), response=Mock())
+            yield {"id": 999}, []
+
+        mock_fetch_projects_payloads.side_effect = fetch_projects_payloads
+
+        assert _update_projects(project_ids=[111, 999]) == {111: ["Project #111: boom"]}
+
+
 class PopulateGristTableTests(TestCase):
     @pytest.mark.django_db
     def test_config_does_not_exist(self):
@@ -52,6 +287,147 @@ class PopulateGristTableTests(TestCase):
             "GristConfig with id=40d26f87-8b91-4670-a196-bfdcbc39eabb does not exist"
         )
 
+    @pytest.mark.django_db
+    @override_settings(GRIST_POPULATE_CHUNK_SIZE=2)
+    @patch("main.tasks.chord")
+    @patch("main.tasks.RecocoApiClient.iter_projects")
+    @patch("main.tasks.GristApiClient.create_table")
+    def test_chunks_dispatched(self, mock_create_table, mock_iter_projects, mock_chord):
+        mock_iter_projects.return_value = iter([{"id": i} for i in range(5)])
+
+        config = GristConfigFactory()
+        populate_grist_table(config_id=config.id)
+
+        mock_create_table.assert_called_once()
+        assert GristConfig.objects.get(id=config.id).synced_until is not None
+        chunks = mock_chord.call_args.args[0]
+        assert [chunk.kwargs["project_ids"] for chunk in chunks] == [
+            [0, 1],
+            [2, 3],
+            [4],
+        ]
+        mock_chord.return_value.assert_called_once()
+
+    @pytest.mark.django_db
+    @override_settings(GRIST_API_BATCH_SIZE=2)
+    @patch("main.services.AsyncRecocoApiClient.get_project", AsyncMock(side_effect=_get_project))
+    @patch("main.tasks.GristApiClient.create_records")
+    @patch("main.tasks.fetch_projects_data")
+    def test_chunk(self, mock_fetch_projects_data, mock_create_records):
+        mock_fetch_projects_data.return_value = iter([(i, {"name": f"p{i}"}) for i in range(3)])
+
+        config = GristConfigFactory()
+        job = SyncJob.objects.create(grist_config=config, kind=SyncJobKind.POPULATE)
+        assert populate_grist_table_chunk(job_id=str(job.id), project_ids=[0, 1, 2]) == {
+            "projects": 3,
+            "records": 3,
+        }
+        assert list(mock_fetch_projects_data.call_args.kwargs["projects"]) == [
+            {"id": 0},
+            {"id": 1},
+            {"id": 2},
+        ]
+
+        assert mock_create_records.call_count == 2
+        assert GristRecordState.objects.filter(grist_config_id=config.id).count() == 3
+        job.refresh_from_db()
+        assert (job.processed_projects, job.written_records) == (3, 3)
+
+    @pytest.mark.django_db
+    @patch("main.tasks.chord")
+    @patch("main.tasks.RecocoApiClient.iter_projects")
+    @patch("main.tasks.GristApiClient.create_table")
+    def test_resume(self, mock_create_table, mock_iter_projects, mock_chord):
+        mock_iter_projects.return_value = iter([{"id": i} for i in range(5)])
+
+        config = GristConfigFactory()
+        job = _stale_job(grist_config=config, kind=SyncJobKind.POPULATE)
+        with patch("main.tasks.grist_table_exists", return_value=True):
+            populate_grist_table(config_id=config.id)
+
+        mock_create_table.assert_not_called()
+        assert mock_chord.call_args.args[0][0].kwargs["job_id"] == str(job.id)
+        job.refresh_from_db()
+        assert job.status == SyncJobStatus.RUNNING
+
+    @pytest.mark.django_db
+    @patch("main.tasks.chord", Mock())
+    @patch("main.tasks.RecocoApiClient.iter_projects", Mock(return_value=iter([{"id": 1}])))
+    @patch("main.tasks.GristApiClient.create_table")
+    def test_resume_table_missing(self, mock_create_table):
+        config = GristConfigFactory()
+        _stale_job(grist_config=config, kind=SyncJobKind.POPULATE)
+        with patch("main.tasks.grist_table_exists", return_value=False):
+            populate_grist_table(config_id=config.id)
+
+        mock_create_table.assert_called_once()
+
+    @pytest.mark.django_db
+    @patch("main.tasks.chord")
+    @patch("main.tasks.RecocoApiClient.iter_projects", Mock(return_value=iter([{"id": 1}])))
+    @patch("main.tasks.GristApiClient.create_table")
+    def test_failed_job_not_resumed(self, mock_create_table, mock_chord):
+        config = GristConfigFactory()
+        job = SyncJob.objects.create(
+            grist_config=config, kind=SyncJobKind.POPULATE, status=SyncJobStatus.FAILED
+        )
+        populate_grist_table(config_id=config.id)
+
+        mock_create_table.assert_called_once()
+        assert mock_chord.call_args.args[0][0].kwargs["job_id"] != str(job.id)
+
+    @pytest.mark.django_db
+    @patch("main.tasks.chord")
+    @patch("main.tasks.RecocoApiClient.iter_projects")
+    @patch("main.tasks.GristApiClient.create_table")
+    def test_running_job_not_run_twice(self, mock_create_table, mock_iter_projects, mock_chord):
+        config = GristConfigFactory()
+        SyncJob.objects.create(grist_config=config, kind=SyncJobKind.POPULATE)
+        populate_grist_table(config_id=config.id)
+
+        mock_create_table.assert_not_called()
+        mock_iter_projects.assert_not_called()
+        mock_chord.assert_not_called()
+        assert SyncJob.objects.filter(grist_config=config).count() == 1
+
+    @pytest.mark.django_db
+    @patch("main.services.AsyncRecocoApiClient.get_project", AsyncMock(side_effect=_get_project))
+    @patch("main.tasks.GristApiClient.create_records")
+    @patch("main.tasks.fetch_projects_data")
+    def test_chunk_resume(self, mock_fetch_projects_data, mock_create_records):
+        mock_fetch_projects_data.side_effect = lambda config, projects: (
+            (project["id"], {"name": "p"}) for project in projects
+        )
+
+        config = GristConfigFactory()
+        job = SyncJob.objects.create(grist_config=config, kind=SyncJobKind.POPULATE)
+        GristRecordState.objects.create(grist_config=config, object_id=1, content_hash="x")
+
+        populate_grist_table_chunk(job_id=str(job.id), project_ids=[1, 2])
+
+        mock_create_records.assert_called_once_with(
+            table_id=config.table_id, records=[{"object_id": 2, "name": "p"}]
+        )
+
+    @pytest.mark.django_db
+    @patch("main.services.AsyncRecocoApiClient.get_project", AsyncMock(side_effect=_get_project))
+    @patch("main.tasks.GristApiClient.create_records")
+    @patch("main.tasks.fetch_projects_data")
+    def test_chunk_project_deleted(self, mock_fetch_projects_data, mock_create_records):
+        mock_fetch_projects_data.side_effect = lambda config, projects: (
+            (project["id"], {"name": "p"}) for project in projects
+        )
+
+        config = GristConfigFactory()
+        job = SyncJob.objects.create(grist_config=config, kind=SyncJobKind.POPULATE)
+
+        # deleted since it was listed
+        populate_grist_table_chunk(job_id=str(job.id), project_ids=[404, 2])
+
+        mock_create_records.assert_called_once_with(
+            table_id=config.table_id, records=[{"object_id": 2, "name": "p"}]
+        )
+
 
 class RefreshGristTableTests(TestCase):
     @pytest.mark.django_db
@@ -63,22 +439,179 @@ class RefreshGristTableTests(TestCase):
         )
 
     @pytest.mark.django_db
-    @patch("main.tasks.update_or_create_project_record")
+    @patch("main.tasks.RecocoApiClient.iter_projects")
+    @patch("main.tasks.update_or_create_project_records")
     @patch("main.tasks.fetch_projects_data")
-    def test_update_or_create_project_record_call(
+    def test_update_or_create_project_records_call(
         self,
         mock_fetch_projects_data,
-        mock_update_or_create_project_record,
+        mock_update_or_create_project_records,
+        mock_iter_projects,
     ):
-        mock_fetch_projects_data.return_value = [("project_id", {"project_data": "data"})]
+        mock_fetch_projects_data.return_value = [(999, {"project_data": "data"})]
+        mock_update_or_create_project_records.side_effect = lambda projects_data, **kwargs: list(
+            projects_data
+        )
 
         config = GristConfigFactory()
         refresh_grist_table(config_id=config.id)
 
-        mock_fetch_projects_data.assert_called_once_with(config=config)
+        mock_fetch_projects_data.assert_called_once()
+        assert mock_fetch_projects_data.call_args.kwargs["config"].id == config.id
+        mock_update_or_create_project_records.assert_called_once()
+        assert mock_update_or_create_project_records.call_args.kwargs["config"].id == config.id
 
-        mock_update_or_create_project_record.assert_called_once_with(
-            config=config,
-            project_id="project_id",
-            project_data={"project_data": "data"},
+    @pytest.mark.django_db
+    @override_settings(GRIST_API_BATCH_SIZE=2)
+    @patch("main.services.GristApiClient.get_records", Mock(return_value={"records": []}))
+    @patch("main.services.GristApiClient.create_records")
+    @patch("main.tasks.RecocoApiClient.iter_projects")
+    @patch("main.tasks.fetch_projects_data")
+    def test_resume(self, mock_fetch_projects_data, mock_iter_projects, mock_create_records):
+        mock_iter_projects.side_effect = lambda: iter([{"id": i} for i in range(5)])
+        mock_fetch_projects_data.side_effect = lambda config, projects: (
+            (project["id"], {"name": "p"}) for project in projects
         )
+
+        config = GristConfigFactory()
+        job = _stale_job(grist_config=config, kind=SyncJobKind.REFRESH, cursor=1)
+        refresh_grist_table(config_id=config.id)
+
+        assert [
+            record["object_id"]
+            for c in mock_create_records.call_args_list
+            for record in c.kwargs["records"]
+        ] == [2, 3, 4]
+        job.refresh_from_db()
+        assert (job.status, job.cursor, job.processed_projects) == (SyncJobStatus.DONE, 4, 3)
+
+    @pytest.mark.django_db
+    @patch("main.services.GristApiClient.get_records", Mock(return_value={"records": []}))
+    @patch("main.services.GristApiClient.create_records")
+    @patch("main.tasks.RecocoApiClient.iter_projects")
+    @patch("main.tasks.fetch_projects_data")
+    def test_resume_cursor_not_listed(
+        self, mock_fetch_projects_data, mock_iter_projects, mock_create_records
+    ):
+        mock_iter_projects.side_effect = lambda: iter([{"id": i} for i in range(3)])
+        mock_fetch_projects_data.side_effect = lambda config, projects: (
+            (project["id"], {"name": "p"}) for project in projects
+        )
+
+        config = GristConfigFactory()
+        _stale_job(grist_config=config, kind=SyncJobKind.REFRESH, cursor=99)
+        refresh_grist_table(config_id=config.id)
+
+        assert [
+            record["object_id"]
+            for c in mock_create_records.call_args_list
+            for record in c.kwargs["records"]
+        ] == [0, 1, 2]
+
+    @pytest.mark.django_db
+    @patch("main.services.GristApiClient.get_records", Mock(return_value={"records": []}))
+    @patch("main.services.GristApiClient.create_records")
+    @patch("main.tasks.RecocoApiClient.iter_projects")
+    @patch("main.tasks.fetch_projects_data")
+    def test_failed_job_not_resumed(
+        self, mock_fetch_projects_data, mock_iter_projects, mock_create_records
+    ):
+        mock_iter_projects.side_effect = lambda: iter([{"id": i} for i in range(3)])
+        mock_fetch_projects_data.side_effect = lambda config, projects: (
+            (project["id"], {"name": "p"}) for project in projects
+        )
+
+        config = GristConfigFactory()
+        job = SyncJob.objects.create(
+            grist_config=config, kind=SyncJobKind.REFRESH, status=SyncJobStatus.FAILED, cursor=1
+        )
+        refresh_grist_table(config_id=config.id)
+
+        assert [
+            record["object_id"]
+            for c in mock_create_records.call_args_list
+            for record in c.kwargs["records"]
+        ] == [0, 1, 2]
+        job.refresh_from_db()
+        assert job.status == SyncJobStatus.FAILED
+
+
+class SyncUpdatedProjectsTests(TestCase):
+    @pytest.mark.django_db
+    @patch("main.tasks.upsert_configs_project_records")
+    @patch("main.tasks.fetch_projects_payloads")
+    def test_sync_since_watermark(
+        self,
+        mock_fetch_projects_payloads,
+        mock_upsert_configs_project_records,
+    ):
+        def _fetch_projects_payloads(keep_project, **kwargs):
+            projects = [
+                {"id": 1, "updated_on": "2024-06-01T10:00:00+02:00"},
+                {"id": 2, "updated_on": "2024-06-03T10:00:00+02:00"},
+            ]
+            return [(project, []) for project in projects if keep_project(project)]
+
+        mock_fetch_projects_payloads.side_effect = _fetch_projects_payloads
+        mock_upsert_configs_project_records.return_value = [None]
+
+        config = GristConfigFactory(synced_until=parse_datetime("2024-06-02T10:00:00+02:00"))
+        # no project updated since its watermark, its table is not touched
+        up_to_date_config = GristConfigFactory(
+            synced_until=parse_datetime("2024-06-04T10:00:00+02:00")
+        )
+        # never populated, or being populated, their records are left to the populate job
+        GristConfigFactory(synced_until=None)
+        SyncJob.objects.create(
+            grist_config=GristConfigFactory(
+                synced_until=parse_datetime("2024-06-02T10:00:00+02:00")
+            ),
+            kind=SyncJobKind.POPULATE,
+        )
+        sync_updated_projects()
+
+        mock_upsert_configs_project_records.assert_called_once()
+        [(updated_config, projects_data)] = mock_upsert_configs_project_records.call_args.args[0]
+        assert updated_config.id == config.id
+        assert list(projects_data) == [2]
+        assert GristConfig.objects.get(id=up_to_date_config.id).synced_until == parse_datetime(
+            "2024-06-04T10:00:00+02:00"
+        )
+        assert GristConfig.objects.get(id=config.id).synced_until == parse_datetime(
+            "2024-06-03T10:00:00+02:00"
+        )
+
+
+class ConsumeWebhookStreamTests(TestCase):
+    @pytest.mark.django_db
+    @patch("main.tasks.process_webhook_event.apply_async")
+    @patch("main.tasks.ack_webhook_events")
+    @patch("main.tasks.read_webhook_events")
+    def test_events_materialized(self, mock_read, mock_ack, mock_apply_async):
+        def _entry(object_type, object_id, project_id=None):
+            return {
+                "remote_ip": "127.0.0.1",
+                "headers": {},
+                "data": {
+                    "topic": f"{object_type}/update",
+                    "object": {"id": object_id, "project": project_id},
+                    "object_type": object_type,
+                    "webhook_uuid": "c209eaf7-8215-4346-9c75-82cf262dc5c3",
+                },
+            }
+
+        mock_read.return_value = [
+            ("1-0", _entry(ObjectType.PROJECT, 999)),
+            ("2-0", _entry(ObjectType.SURVEY_ANSWER, 888, project_id=999)),
+            ("3-0", _entry(ObjectType.PROJECT, 111)),
+        ]
+
+        consume_webhook_stream()
+
+        assert sorted(WebhookEvent.objects.values_list("project_id", flat=True)) == [
+            111,
+            999,
+            999,
+        ]
+        mock_ack.assert_called_once_with(["1-0", "2-0", "3-0"])
+        assert mock_apply_async.call_count == 2
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import random
+import time
+
 import pytest
-from main.utils import str2bool
+from main.utils import ordered_concurrent_map, str2bool
 
 
 def test_str2bool():
@@ -9,3 +12,14 @@ def test_str2bool():
     assert str2bool("False") is False
     with pytest.raises(ValueError):
         str2bool("invalid")
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_ordered_concurrent_map(max_workers):
+    def _slow_square(value):
+        time.sleep(random.random() / 100)
+        return value * value
+
+    assert list(ordered_concurrent_map(_slow_square, range(20), max_workers=max_workers)) == [
+        v * v for v in range(20)
+    ]
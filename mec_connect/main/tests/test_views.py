@@ -1,16 +1,22 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import hmac
 import json
 from datetime import datetime
 from json import JSONEncoder
 from typing import Any
+from unittest.mock import patch
 
 import pytest
 from django.conf import settings
+from django.test import override_settings
 from django.urls import reverse
 from django.utils import timezone
+from main.models import WebhookEvent
+from main.views import async_router
+from ninja.testing import TestAsyncClient
 
 default_payload = {
     "topic": "projects.Project/update",
@@ -29,8 +35,13 @@ default_headers = {
 }
 
 
-def _webhook_headers(payload: dict[str, Any], headers: dict[str, str] = None, secret: str = None):
-    timestamp = int(datetime.timestamp(timezone.now()))
+def _webhook_headers(
+    payload: dict[str, Any],
+    headers: dict[str, str] = None,
+    secret: str = None,
+    timestamp: int = None,
+):
+    timestamp = timestamp or int(datetime.timestamp(timezone.now()))
     combined_payload = f"{timestamp}:{json.dumps(payload, cls=JSONEncoder)}"
     secret = secret or settings.WEBHOOK_SECRET
     signature = hmac.new(
@@ -65,3 +76,167 @@ def test_invalid_signature(client):
         content_type="application/json",
     )
     assert resp.status_code == 401, resp.content
+
+
+@pytest.mark.django_db
+@override_settings(WEBHOOK_SECRET="new-secret", WEBHOOK_EXTRA_SECRETS=["old-secret"])
+def test_webhook_secret_rotation(client):
+    for secret, status_code in (("new-secret", 200), ("old-secret", 200), ("other", 401)):
+        resp = client.post(
+            reverse("api:webhook"),
+            headers=_webhook_headers(default_payload, default_headers, secret=secret),
+            data=default_payload,
+            content_type="application/json",
+        )
+        assert resp.status_code == status_code, resp.content
+
+    # any of several signatures
+    headers = _webhook_headers(default_payload, default_headers, secret="other")
+    valid_headers = _webhook_headers(default_payload, default_headers, secret="new-secret")
+    headers["Django-Webhook-Signature-v1"] += "," + valid_headers["Django-Webhook-Signature-v1"]
+    resp = client.post(
+        reverse("api:webhook"),
+        headers=headers,
+        data=default_payload,
+        content_type="application/json",
+    )
+    assert resp.status_code == 200, resp.content
+
+
+def test_webhook_stale_timestamp(client):
+    stale = int(datetime.timestamp(timezone.now())) - settings.WEBHOOK_TIMESTAMP_TOLERANCE - 60
+    with patch("main.security._hmac_states") as mock_hmac_states:
+        resp = client.post(
+            reverse("api:webhook"),
+            headers=_webhook_headers(default_payload, default_headers, timestamp=stale),
+            data=default_payload,
+            content_type="application/json",
+        )
+    assert resp.status_code == 401, resp.content
+    mock_hmac_states.assert_not_called()
+
+    headers = _webhook_headers(default_payload, default_headers)
+    del headers["Django-Webhook-Request-Timestamp"]
+    resp = client.post(
+        reverse("api:webhook"),
+        headers=headers,
+        data=default_payload,
+        content_type="application/json",
+    )
+    assert resp.status_code == 401, resp.content
+
+
+@pytest.mark.django_db
+@override_settings(WEBHOOK_STREAM="webhooks")
+def test_webhook_stream(client):
+    with patch("main.views.append_webhook_event", return_value="1-0") as mock_append:
+        resp = client.post(
+            reverse("api:webhook"),
+            headers=_webhook_headers(default_payload, default_headers),
+            data=default_payload,
+            content_type="application/json",
+        )
+    assert resp.status_code == 202, resp.content
+    assert resp.json() == {"id": "1-0", "status": "ACCEPTED"}
+    assert mock_append.call_args.kwargs["data"] == default_payload
+    assert not WebhookEvent.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_webhooks_batch(client):
+    payload = [
+        default_payload,
+        default_payload | {"object": {"id": 10}},
+        default_payload | {"object": {"id": 10, "updated_on": "2024-02-23T10:00:00.000Z"}},
+    ]
+    with patch("main.triggers.process_webhook_events.apply_async") as mock_apply_async:
+        resp = client.post(
+            reverse("api:webhooks_batch"),
+            headers=_webhook_headers(payload, default_headers),
+            data=payload,
+            content_type="application/json",
+        )
+    assert resp.status_code == 200, resp.content
+
+    ids = resp.json()["ids"]
+    assert len(ids) == 3
+    assert sorted(WebhookEvent.objects.values_list("project_id", flat=True)) == [9, 10, 10]
+    mock_apply_async.assert_called_once()
+    assert mock_apply_async.call_args.kwargs["kwargs"] == {"event_ids": ids}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_webhook_duplicate_delivery(client):
+    with patch("main.triggers.process_webhook_event.apply_async") as mock_apply_async:
+        ids = []
+        for _ in range(2):
+            resp = client.post(
+                reverse("api:webhook"),
+                headers=_webhook_headers(default_payload, default_headers),
+                data=default_payload,
+                content_type="application/json",
+            )
+            assert resp.status_code == 200, resp.content
+            ids.append(resp.json()["id"])
+
+    assert ids[0] == ids[1]
+    assert WebhookEvent.objects.count() == 1
+    mock_apply_async.assert_called_once()
+
+    # the retries are dropped from a batch as well
+    payload = [default_payload, default_payload | {"object": {"id": 10}}]
+    with patch("main.triggers.process_webhook_events.apply_async") as mock_apply_async:
+        resp = client.post(
+            reverse("api:webhooks_batch"),
+            headers=_webhook_headers(payload, default_headers),
+            data=payload,
+            content_type="application/json",
+        )
+    assert resp.status_code == 200, resp.content
+    assert resp.json()["ids"] == [
+        str(WebhookEvent.objects.get(project_id=10).id),
+    ]
+    assert mock_apply_async.call_args.kwargs["kwargs"] == {"event_ids": resp.json()["ids"]}
+
+
+@pytest.mark.django_db(transaction=True)
+@patch("main.triggers.process_webhook_event.apply_async")
+def test_webhook_same_payload_delivered_later(mock_apply_async, client):
+    # delivered again once its object went through another state and back
+    for dedup_window in (1, 2):
+        with patch("main.models.WebhookEvent.current_dedup_window", return_value=dedup_window):
+            resp = client.post(
+                reverse("api:webhook"),
+                headers=_webhook_headers(default_payload, default_headers),
+                data=default_payload,
+                content_type="application/json",
+            )
+        assert resp.status_code == 200, resp.content
+
+    assert WebhookEvent.objects.count() == 2
+    assert mock_apply_async.call_count == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_webhook():
+    client = TestAsyncClient(async_router)
+    with patch("main.triggers.process_webhook_event.apply_async") as mock_apply_async:
+        resp = asyncio.run(
+            client.post(
+                "/webhook",
+                headers=_webhook_headers(default_payload, default_headers),
+                body=json.dumps(default_payload, cls=JSONEncoder).encode(),
+            )
+        )
+    assert resp.status_code == 200, resp.content
+    assert WebhookEvent.objects.get(id=resp.json()["id"]).project_id == 9
+    mock_apply_async.assert_called_once()
+
+    resp = asyncio.run(
+        client.post(
+            "/webhook",
+            headers=_webhook_headers(default_payload, default_headers, secret="wrong-secret"),
+            body=json.dumps(default_payload, cls=JSONEncoder).encode(),
+        )
+    )
+    assert resp.status_code == 401, resp.content
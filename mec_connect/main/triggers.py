@@ -1,11 +1,28 @@
 from __future__ import annotations
 
+from django.conf import settings
+
 from .choices import WebhookEventStatus
 from .models import WebhookEvent
-from .tasks import process_webhook_event
+from .tasks import process_webhook_event, process_webhook_events
 
 
 def on_webhook_event_commit(event: WebhookEvent) -> None:
     if event.status != WebhookEventStatus.PENDING:
         return
-    process_webhook_event.delay(event.id)
+    if settings.WEBHOOK_BATCH_PROCESSING:
+        # claimed later on by the periodic batch processing
+        return
+    # delayed so that the following events of the same project are processed along
+    process_webhook_event.apply_async((event.id,), countdown=settings.WEBHOOK_COALESCE_DELAY)
+
+
+def on_webhook_events_commit(events: list[WebhookEvent]) -> None:
+    if settings.WEBHOOK_BATCH_PROCESSING:
+        # claimed later on by the periodic batch processing
+        return
+    # a single task for the whole batch, each project being fetched once
+    process_webhook_events.apply_async(
+        kwargs={"event_ids": [str(event.id) for event in events]},
+        countdown=settings.WEBHOOK_COALESCE_DELAY,
+    )
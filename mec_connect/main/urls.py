@@ -1,10 +1,11 @@
 from __future__ import annotations
 
+from django.conf import settings
 from django.urls import path, reverse_lazy
 from django.views.generic import RedirectView
 from ninja import NinjaAPI
 
-from .views import router
+from .views import async_router, router
 
 api = NinjaAPI(
     title="MEC Connect API",
@@ -15,7 +16,7 @@ api = NinjaAPI(
     urls_namespace="api",
 )
 
-api.add_router("", router)
+api.add_router("", async_router if settings.API_ASYNC else router)
 
 urlpatterns = [
     path("", RedirectView.as_view(url=reverse_lazy("admin:index"))),
@@ -1,5 +1,10 @@
 from __future__ import annotations
 
+from collections import deque
+from collections.abc import Callable, Generator, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
 
 def str2bool(value: str) -> bool:
     """Convert a string value to a boolean value."""
@@ -9,3 +14,32 @@ def str2bool(value: str) -> bool:
     if value.lower() in ("no", "false", "f", "0"):
         return False
     raise ValueError(f"Invalid boolean value {value}")
+
+
+def ordered_concurrent_map(
+    func: Callable[[Any], Any], iterable: Iterable[Any], max_workers: int
+) -> Generator[Any]:
+    """
+    Apply a function to the items of an iterable in a pool of threads,
+    yielding the results lazily in the order of the input items.
+
+    At most `2 * max_workers` items are in flight at the same time, so that
+    the input iterable is consumed at the pace of the output.
+    """
+
+    if max_workers < 2:
+        yield from map(func, iterable)
+        return
+
+    pending: deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in iterable:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= 2 * max_workers:
+                    yield pending.popleft().result()
+            while len(pending):
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
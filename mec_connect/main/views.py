@@ -1,33 +1,119 @@
 from __future__ import annotations
 
-from copy import deepcopy as copy
 from functools import partial
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction
 from django.http import HttpRequest
 from ninja import Router
+from ninja.errors import HttpError
 
+from .choices import WebhookEventStatus
 from .models import WebhookEvent
-from .schemas import WebhookEventSchema
-from .security import SecurityAuth
-from .triggers import on_webhook_event_commit
+from .schemas import WebhookEventBatchStatusSchema, WebhookEventSchema, WebhookEventStatusSchema
+from .security import AsyncSecurityAuth, SecurityAuth
+from .streams import append_webhook_event
+from .triggers import on_webhook_event_commit, on_webhook_events_commit
 
 router = Router()
 
 
-@router.post("/webhook", auth=SecurityAuth())
+@router.post(
+    "/webhook",
+    auth=SecurityAuth(),
+    response={200: WebhookEventStatusSchema, 202: WebhookEventStatusSchema},
+)
 def webhook(request: HttpRequest, payload: WebhookEventSchema):
-    # FIXME: fix this stuff, make something simpler
-    data = payload.dict()
-    data["payload"] = copy(data)
-    obj = data.pop("object")
-    data["object_id"] = obj["id"]
+    if settings.WEBHOOK_STREAM:
+        # the event is materialized later on by the stream consumer
+        entry_id = append_webhook_event(
+            remote_ip=request.META.get("REMOTE_ADDR", "0.0.0.0"),
+            headers=dict(request.headers),
+            data=payload.dict(),
+        )
+        return 202, {"id": entry_id, "status": "ACCEPTED"}
 
     with transaction.atomic():
-        event = WebhookEvent.create_from_request(request, **data)
-        transaction.on_commit(partial(on_webhook_event_commit, event=event))
+        event, created = WebhookEvent.create_from_request(request, payload=payload.dict())
+        # a retried delivery is not processed again
+        if created:
+            transaction.on_commit(partial(on_webhook_event_commit, event=event))
 
     return {
         "id": event.id,
         "status": event.status,
     }
+
+
+@router.post("/webhooks/batch", auth=SecurityAuth(), response=WebhookEventBatchStatusSchema)
+def webhooks_batch(request: HttpRequest, payload: list[WebhookEventSchema]):
+    if not len(payload):
+        raise HttpError(400, "No events")
+
+    with transaction.atomic():
+        events = WebhookEvent.bulk_create_from_request(
+            request, payloads=[event.dict() for event in payload]
+        )
+        if len(events):
+            transaction.on_commit(partial(on_webhook_events_commit, events=events))
+
+    return {
+        "ids": [event.id for event in events],
+        "status": WebhookEventStatus.PENDING,
+    }
+
+
+# Async versions of the endpoints, served instead of the sync ones under an ASGI
+# server when API_ASYNC is enabled
+async_router = Router()
+
+
+@async_router.post(
+    "/webhook",
+    auth=AsyncSecurityAuth(),
+    response={200: WebhookEventStatusSchema, 202: WebhookEventStatusSchema},
+    url_name="webhook",
+)
+async def async_webhook(request: HttpRequest, payload: WebhookEventSchema):
+    if settings.WEBHOOK_STREAM:
+        # the Redis and broker calls don't touch the database, and are not run on the
+        # single thread shared by the sync code, so that the requests are concurrent
+        entry_id = await sync_to_async(append_webhook_event, thread_sensitive=False)(
+            remote_ip=request.META.get("REMOTE_ADDR", "0.0.0.0"),
+            headers=dict(request.headers),
+            data=payload.dict(),
+        )
+        return 202, {"id": entry_id, "status": "ACCEPTED"}
+
+    # in autocommit mode, the event is committed once created
+    event, created = await WebhookEvent.acreate_from_request(request, payload=payload.dict())
+    if created:
+        await sync_to_async(on_webhook_event_commit, thread_sensitive=False)(event=event)
+
+    return {
+        "id": event.id,
+        "status": event.status,
+    }
+
+
+@async_router.post(
+    "/webhooks/batch",
+    auth=AsyncSecurityAuth(),
+    response=WebhookEventBatchStatusSchema,
+    url_name="webhooks_batch",
+)
+async def async_webhooks_batch(request: HttpRequest, payload: list[WebhookEventSchema]):
+    if not len(payload):
+        raise HttpError(400, "No events")
+
+    events = await WebhookEvent.abulk_create_from_request(
+        request, payloads=[event.dict() for event in payload]
+    )
+    if len(events):
+        await sync_to_async(on_webhook_events_commit, thread_sensitive=False)(events=events)
+
+    return {
+        "ids": [event.id for event in events],
+        "status": WebhookEventStatus.PENDING,
+    }
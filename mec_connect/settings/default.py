@@ -88,6 +88,12 @@ TEMPLATES = [
 #
 DATABASES = {"default": env.db()}
 
+#
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+#
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
 #
 # Authentication
 # https://simpleisbetterthancomplex.com/tutorial/2016/07/22/how-to-extend-django-user-model.html#abstractbaseuser
@@ -133,11 +139,78 @@ CELERY_BROKER_URL = env.str("BROKER_URL")
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_ALWAYS_EAGER = env.bool("CELERY_ALWAYS_EAGER", default=False)
 CELERY_RESULT_BACKEND = "django-db"
+CELERY_BEAT_SCHEDULE = {
+    "sync-updated-projects": {
+        "task": "main.tasks.sync_updated_projects",
+        # interval (in seconds) of the incremental sync recovering the missed webhook events
+        "schedule": env.int("SYNC_UPDATED_PROJECTS_INTERVAL", default=5 * 60),
+    },
+}
+
+#
+# API
+#
+# Serve the async views, under an ASGI server (see bin/run_server.sh)
+API_ASYNC = env.bool("API_ASYNC", default=False)
 
 #
 # Webhook security
 #
 WEBHOOK_SECRET = env.str("WEBHOOK_SECRET")
+# Previous secrets, still accepted during a rotation
+WEBHOOK_EXTRA_SECRETS = env.list("WEBHOOK_EXTRA_SECRETS", default=[])
+# Max age (in seconds) of a request timestamp, 0 to accept any
+WEBHOOK_TIMESTAMP_TOLERANCE = env.int("WEBHOOK_TIMESTAMP_TOLERANCE", default=5 * 60)
+# Window (in seconds) within which the retries of a delivery are dropped, 0 to keep them
+WEBHOOK_DEDUP_WINDOW = env.int("WEBHOOK_DEDUP_WINDOW", default=60 * 60)
+# Delay (in seconds) during which the events of a same project are coalesced
+WEBHOOK_COALESCE_DELAY = env.int("WEBHOOK_COALESCE_DELAY", default=10)
+# Pending events are claimed periodically by batches, instead of one task per event
+WEBHOOK_BATCH_PROCESSING = env.bool("WEBHOOK_BATCH_PROCESSING", default=False)
+WEBHOOK_BATCH_SIZE = env.int("WEBHOOK_BATCH_SIZE", default=500)
+WEBHOOK_BATCH_INTERVAL = env.int("WEBHOOK_BATCH_INTERVAL", default=30)
+# Delay (in seconds) after which events still being processed are claimed again
+WEBHOOK_PROCESSING_TIMEOUT = env.int("WEBHOOK_PROCESSING_TIMEOUT", default=CELERY_TASK_TIME_LIMIT)
+# Events which failed are processed again after a delay (in seconds), up to a number of attempts
+WEBHOOK_MAX_ATTEMPTS = env.int("WEBHOOK_MAX_ATTEMPTS", default=5)
+WEBHOOK_RETRY_DELAY = env.int("WEBHOOK_RETRY_DELAY", default=60)
+
+# Redis stream buffering the incoming events, materialized by a periodic consumer
+# (disabled when empty)
+WEBHOOK_STREAM = env.str("WEBHOOK_STREAM", default="")
+WEBHOOK_STREAM_URL = env.str("WEBHOOK_STREAM_URL", default=CELERY_BROKER_URL)
+WEBHOOK_STREAM_GROUP = env.str("WEBHOOK_STREAM_GROUP", default="mec-connect")
+WEBHOOK_STREAM_MAXLEN = env.int("WEBHOOK_STREAM_MAXLEN", default=100_000)
+WEBHOOK_STREAM_INTERVAL = env.float("WEBHOOK_STREAM_INTERVAL", default=2.0)
+
+if WEBHOOK_STREAM:
+    CELERY_BEAT_SCHEDULE["consume-webhook-stream"] = {
+        "task": "main.tasks.consume_webhook_stream",
+        "schedule": WEBHOOK_STREAM_INTERVAL,
+    }
+
+if WEBHOOK_BATCH_PROCESSING:
+    CELERY_BEAT_SCHEDULE["process-webhook-events"] = {
+        "task": "main.tasks.process_webhook_events",
+        "schedule": WEBHOOK_BATCH_INTERVAL,
+    }
+
+#
+# Grist API configuration
+#
+GRIST_API_MAX_CONNECTIONS = env.int("GRIST_API_MAX_CONNECTIONS", default=10)
+GRIST_API_KEEPALIVE_EXPIRY = env.float("GRIST_API_KEEPALIVE_EXPIRY", default=60.0)
+# HTTP/2 requires the httpx[http2] extra
+GRIST_API_HTTP2 = env.bool("GRIST_API_HTTP2", default=False)
+GRIST_API_BATCH_SIZE = env.int("GRIST_API_BATCH_SIZE", default=100)
+# Requests per second to a same Grist host (0 to disable), a config may override it
+GRIST_API_RATE_LIMIT = env.float("GRIST_API_RATE_LIMIT", default=10.0)
+GRIST_API_RATE_BURST = env.int("GRIST_API_RATE_BURST", default=10)
+GRIST_API_MAX_RETRIES = env.int("GRIST_API_MAX_RETRIES", default=3)
+# Number of projects written by each parallel task when populating a table
+GRIST_POPULATE_CHUNK_SIZE = env.int("GRIST_POPULATE_CHUNK_SIZE", default=200)
+# Delay (in seconds) after which a running sync job without progress is resumed
+SYNC_JOB_TIMEOUT = env.int("SYNC_JOB_TIMEOUT", default=CELERY_TASK_TIME_LIMIT)
 
 #
 # Recoco API congiguration
@@ -145,6 +218,21 @@ WEBHOOK_SECRET = env.str("WEBHOOK_SECRET")
 RECOCO_API_URL = env.str("RECOCO_API_URL")
 RECOCO_API_USERNAME = env.str("RECOCO_API_USERNAME")
 RECOCO_API_PASSWORD = env.str("RECOCO_API_PASSWORD")
+RECOCO_API_PAGE_SIZE = env.int("RECOCO_API_PAGE_SIZE", default=100)
+RECOCO_API_CONCURRENCY = env.int("RECOCO_API_CONCURRENCY", default=4)
+RECOCO_API_TOKEN_CACHE = env.str("RECOCO_API_TOKEN_CACHE", default="default")
+RECOCO_API_TOKEN_MARGIN = env.int("RECOCO_API_TOKEN_MARGIN", default=30)
+# Requests per second to the Recoco host (0 to disable)
+RECOCO_API_RATE_LIMIT = env.float("RECOCO_API_RATE_LIMIT", default=10.0)
+RECOCO_API_RATE_BURST = env.int("RECOCO_API_RATE_BURST", default=10)
+RECOCO_API_MAX_RETRIES = env.int("RECOCO_API_MAX_RETRIES", default=3)
+
+#
+# HTTP clients retries
+#
+# Exponential backoff (in seconds) between two attempts, unless a Retry-After is given
+HTTP_BACKOFF_BASE = env.float("HTTP_BACKOFF_BASE", default=0.5)
+HTTP_BACKOFF_MAX = env.float("HTTP_BACKOFF_MAX", default=30.0)
 
 #
 # Sentry